@@ -0,0 +1,88 @@
+#!/usr/bin/env -S uv run
+"""This script benchmarks the bytes allocated per /optimize.csv request, from the query to the solve.
+
+The previous path (fetch float columns, stack them as float32, vstack [-A, A], upcast in linprog) is compared with the
+solver-ready float64 buffer built by dietdashboard.app.get_solver_arrays. Allocations are traced with tracemalloc
+(numpy arrays, including the ones returned by DuckDB's fetchnumpy, are traced), memory allocated inside DuckDB is not.
+"""
+
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+
+import duckdb
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+from dietdashboard.app import PRICE_POLICIES, QUERY, get_con, get_solver_arrays, query_numpy, solve_optimization
+
+RESULTS_DIR = Path(__file__).parent.parent / "tmp/benchmark"
+LOCATION_COUNTS = [1, 5, 20, 100, 1000]
+ITERATIONS = 5
+PRICE_PARAMETERS = {"policy": PRICE_POLICIES[0], "as_of": None}  # The current snapshot of queries/price_columns.sql
+
+
+def previous_path(con: duckdb.DuckDBPyConnection, bounds: dict[str, tuple[float, float]], locations: list[int]):
+    """The path before the solver-ready buffer: float32 stacking, vstack and the float64 upcast inside linprog."""
+    q = QUERY.replace("CAST($objective AS DOUBLE)", "price").replace("COLUMNS($nutrient_ids)::DOUBLE", "COLUMNS($nutrient_ids)")
+    products_and_prices = query_numpy(con, q, locations=locations, nutrient_ids=list(bounds), **PRICE_PARAMETERS)
+    A = np.array([products_and_prices[nutrient_id] for nutrient_id in bounds], dtype=np.float32)
+    c = np.array(products_and_prices["objective"], dtype=np.float32)
+    b = np.array([bounds[nutrient] for nutrient in bounds], dtype=np.float32)
+    A_ub = np.vstack([-A, A])
+    b_ub = np.concatenate([-b[:, 0], b[:, 1]])
+    return solve_optimization(A_ub.astype(np.float64), b_ub.astype(np.float64), c.astype(np.float64))
+
+
+def solver_ready_path(con: duckdb.DuckDBPyConnection, bounds: dict[str, tuple[float, float]], locations: list[int]):
+    q = QUERY.replace("$objective", "price")
+    products_and_prices = query_numpy(con, q, locations=locations, nutrient_ids=list(bounds), **PRICE_PARAMETERS)
+    A_ub, b_ub, c = get_solver_arrays(bounds, products_and_prices)
+    return solve_optimization(A_ub, b_ub, c)
+
+
+METHODS: dict[str, Callable] = {"previous": previous_path, "solver-ready": solver_ready_path}
+
+
+def measure(method: Callable, *args) -> tuple[float, int, int, float]:
+    """Return the seconds, peak bytes allocated, bytes still allocated at the end and the objective of one request."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = method(*args)
+    seconds = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()  # The temporaries freed during the request show up in the peak
+    tracemalloc.stop()
+    return seconds, peak, retained, float(result.fun)
+
+
+if __name__ == "__main__":
+    con = get_con()
+    recommendations = con.sql("SELECT id, value_males, value_upper_intake FROM recommendations").fetchall()
+    bounds = {nid: (0.5 * lower, upper or 4 * lower) for nid, lower, upper in recommendations}
+    location_ids = [row[0] for row in con.sql("SELECT DISTINCT location_id FROM final_table_price ORDER BY 1").fetchall()]
+
+    results_db = duckdb.connect(":memory:")
+    results_db.execute("""CREATE TABLE results
+        (locations INTEGER, products INTEGER, method VARCHAR, time_ms DOUBLE, peak_mb DOUBLE, retained_mb DOUBLE)""")
+    for count in LOCATION_COUNTS:
+        locations = location_ids[:count]
+        num_products = con.execute(
+            "SELECT count(*) FROM final_table_price WHERE location_id IN (SELECT UNNEST($locations))", {"locations": locations}
+        ).fetchone()[0]  # type: ignore[reportOptionalSubscript]
+        objectives = {}
+        for name, method in METHODS.items():
+            method(con, bounds, locations)  # Warm up
+            runs = [measure(method, con, bounds, locations) for _ in range(ITERATIONS)]
+            seconds, peak, retained, objectives[name] = (float(np.median(values)) for values in zip(*runs, strict=True))
+            row = [count, num_products, name, 1000 * seconds, peak / 1e6, retained / 1e6]
+            results_db.execute("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?)", row)
+            print(f"{name:<15} {count:>5} locations {num_products:>7} products {1000 * seconds:>9.2f} ms {peak / 1e6:>8.2f} MB")
+        if not np.isclose(*objectives.values(), rtol=1e-4):
+            print(f"Objectives differ for {count} locations: {objectives}")
+    con.close()
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    results_db.sql("SELECT * FROM results ORDER BY locations, method").show()
+    results_db.sql("SELECT * FROM results").write_csv(str(RESULTS_DIR / "allocations.csv"))
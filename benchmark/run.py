@@ -1,6 +1,7 @@
 #!/usr/bin/env -S uv run --extra benchmark
 """This script benchmarks differency methods for running linear programming"""
 
+import argparse
 import cProfile
 import csv
 import json
@@ -14,11 +15,17 @@ import cvxpy as cp
 import numpy as np
 from scipy.optimize import linprog
 
+from dietdashboard.colgen import solve_column_generation
+from dietdashboard.pdlp import solve_pdlp
+from dietdashboard.scaling import scale_problem, unscale_result
+
 DATA_DIR = Path(__file__).parent.parent / "data"
 BENCHMARK_DATA = DATA_DIR / "benchmark.npz"
 BENCHMARK_DIR = Path(__file__).parent.parent / f"tmp/benchmark/{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
 BENCHMARK_DIR.mkdir(parents=True, exist_ok=True)
 BENCHMARK_RESULT_SUMMARY = BENCHMARK_DIR / "benchmark_results.csv"
+BENCHMARK_SCALING_SUMMARY = BENCHMARK_DIR / "scaling_results.csv"
+BENCHMARK_COLUMN_GENERATION_SUMMARY = BENCHMARK_DIR / "column_generation_results.csv"
 
 
 warnings.filterwarnings("ignore", category=DeprecationWarning)  # filter scipy DeprecationWarning
@@ -62,6 +69,12 @@ def solve_optimization_cvxpy(A, lb, ub, c, solver, solver_options):
     return prob.solve(solver=solver, **solver_options)
 
 
+def solve_optimization_pdlp(A, lb, ub, c, solver_options):
+    A_ub = np.vstack([-A, A]).astype(np.float64)
+    b_ub = np.concatenate([-lb, ub]).astype(np.float64)
+    return solve_pdlp(A_ub, b_ub, c.astype(np.float64), **solver_options)
+
+
 def main(library: str, solver: str, solver_options: dict[str, Any], size: int, iterations: int) -> list[float]:
     objectives = []
     # n = A_nutrients.shape[1]
@@ -77,12 +90,67 @@ def main(library: str, solver: str, solver_options: dict[str, Any], size: int, i
         elif library == "cvxpy":
             out = solve_optimization_cvxpy(A, lb, ub, c, solver, solver_options)
             objective = float(out)  # type: ignore
+        elif library == "dietdashboard" and solver == "pdlp":
+            out = solve_optimization_pdlp(A, lb, ub, c, solver_options)
+            objective = float(out.fun)
         else:
             raise ValueError(f"Unknown library: {library}")
         objectives.append(objective)
     return objectives
 
 
+def solve_scaled_scipy(A, lb, ub, c, solver, solver_options):
+    """Same as solve_optimization_scipy, with the rows and columns equilibrated before the solve."""
+    A_ub, b_ub, c_scaled, row_scale, col_scale = scale_problem(np.vstack([-A, A]), np.concatenate([-lb, ub]), c)
+    out = linprog(c_scaled, A_ub=A_ub, b_ub=b_ub, bounds=(0, None), method=solver, options=solver_options, integrality=0)
+    return unscale_result(out, row_scale, col_scale)
+
+
+def benchmark_scaling(solvers: list[tuple[str, dict[str, Any]]], sizes: list[int], iterations: int) -> None:
+    """Compare the iteration counts and solve times of scipy solvers with and without scaling."""
+    with BENCHMARK_SCALING_SUMMARY.open("w") as f:
+        writer = csv.writer(f)
+        writer.writerow(["solver", "size", "scaled", "time", "nit", "objective"])
+        for size in sizes:
+            A, c = A_nutrients[:, :size].astype(np.float64), c_costs[:size].astype(np.float64)
+            for solver, solver_options in solvers:
+                for scaled, solve in ((False, solve_optimization_scipy), (True, solve_scaled_scipy)):
+                    out = solve(A, lb.astype(np.float64), ub.astype(np.float64), c, solver, solver_options)  # warm up
+                    start = time.perf_counter()
+                    for _ in range(iterations):
+                        out = solve(A, lb.astype(np.float64), ub.astype(np.float64), c, solver, solver_options)
+                    t = (time.perf_counter() - start) / iterations
+                    writer.writerow([solver, size, scaled, t, out.nit, out.fun])
+                    f.flush()
+                    print(f"{solver:<16} {size:>6} {'scaled' if scaled else 'unscaled':<9} {t:>8.4f} s {out.nit:>6} iterations")
+
+
+def solve_full_or_column_generation(method: str, A_ub, b_ub, c):
+    if method == "highs":
+        return linprog(c, A_ub=A_ub, b_ub=b_ub, bounds=(0, None), method="highs")
+    return solve_column_generation(A_ub, b_ub, c)
+
+
+def benchmark_column_generation(sizes: list[int], iterations: int) -> None:
+    """Compare the solve times of column generation (dietdashboard/colgen.py) and of the full LP with HiGHS."""
+    with BENCHMARK_COLUMN_GENERATION_SUMMARY.open("w") as f:
+        writer = csv.writer(f)
+        writer.writerow(["method", "size", "time", "nit", "rounds", "num_columns", "objective"])
+        for size in sizes:
+            A, c = A_nutrients[:, :size].astype(np.float64), c_costs[:size].astype(np.float64)
+            A_ub, b_ub = np.vstack([-A, A]), np.concatenate([-lb, ub]).astype(np.float64)
+            for method in ("highs", "column generation"):
+                out = solve_full_or_column_generation(method, A_ub, b_ub, c)  # warm up
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    out = solve_full_or_column_generation(method, A_ub, b_ub, c)
+                t = (time.perf_counter() - start) / iterations
+                rounds, num_columns = out.get("rounds", 1), out.get("num_columns", size)
+                writer.writerow([method, size, t, out.nit, rounds, num_columns, out.fun])
+                f.flush()
+                print(f"{method:<18} {size:>6} {t:>8.4f} s {out.nit:>6} iterations {rounds:>4} rounds {num_columns:>6} columns")
+
+
 def save_results_as_csv(resluts: dict[tuple[str, str, str], tuple[float, int]]):
     with BENCHMARK_RESULT_SUMMARY.open("w") as f:
         writer = csv.writer(f)
@@ -92,6 +160,12 @@ def save_results_as_csv(resluts: dict[tuple[str, str, str], tuple[float, int]]):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scaling", action="store_true", help="compare the scipy solvers with and without scaling")
+    parser.add_argument("--column-generation", action="store_true", help="compare column generation with the full LP")
+    parser.add_argument("--skip-solvers", action="store_true", help="skip the benchmark of all the solvers")
+    args = parser.parse_args()
+
     # save_benchmark_data()
     bounds = json.load((DATA_DIR / "input.json").open())
     # bounds = {k: bounds[k] for k in ["energy_fibre_kcal", "protein", "carbohydrate", "fat"]}
@@ -136,6 +210,9 @@ if __name__ == "__main__":
         ("scipy", "interior-point", {}),
         ("scipy", "revised simplex", {}),
         ("scipy", "simplex", {"maxiter": 10_000}),
+        # library dietdashboard: restarted PDHG (dietdashboard/pdlp.py), approximate and with the crossover polish
+        ("dietdashboard", "pdlp", {"tolerance": 1e-4}),
+        ("dietdashboard", "pdlp", {"tolerance": 1e-4, "crossover": True}),
     ]
     # Currently best:
     # GLPK_MI for MIP and speed
@@ -143,6 +220,16 @@ if __name__ == "__main__":
 
     sizes = [100, 200, 500, 1000, 2000, 5000, 10000]
     num_iterations = 10
+
+    # Iteration counts and times with and without the scaling of dietdashboard/scaling.py
+    if args.scaling:
+        scaling_solvers = [("revised simplex", {}), ("highs-ds", {}), ("highs-ipm", {}), ("interior-point", {})]
+        benchmark_scaling(scaling_solvers, sizes, num_iterations)
+    # Column generation against the full LP, also beyond the sizes of the other solvers
+    if args.column_generation:
+        benchmark_column_generation([*sizes, A_nutrients.shape[1]], num_iterations)
+    if args.skip_solvers:
+        raise SystemExit
     very_slow_solvers = {
         ("cvxpy", "CVXOPT"),
         ("cvxpy", "SCIPY"),
@@ -0,0 +1,39 @@
+"""Admission control of the solves: limits on the candidate products, the concurrent solves and the solve time.
+
+It applies to every route that solves LPs: the optimization (/optimize.csv), the household basket (/household.csv) and
+the achievable ranges (/ranges, 2 LPs per nutrient, its time limit is checked between the LPs). Before its solve, a
+request is
+    rejected:  when the solver queue is full, with a fast 503 and a Retry-After (see dietdashboard/executor.py)
+    degraded:  when all the solver workers are busy, solved by the simplex (without column generation) over a presolved
+               subset of DEGRADED_CANDIDATE_PRODUCTS candidates within DEGRADED_TIME_LIMIT, so that it frees its worker
+               quickly
+    admitted:  otherwise.
+With more than MAX_CANDIDATE_PRODUCTS candidates, the LP is solved over a presolved subset of them (candidate_subset).
+Every solve gets at most SOLVE_TIME_LIMIT seconds (less if the request asks for it), a solve stopped by the time limit
+returns its best answer when it has one. The outcome is recorded in the timings.
+"""
+
+import numpy as np
+
+MAX_CANDIDATE_PRODUCTS = 20_000  # More candidate products are reduced to a subset of this size
+SOLVE_TIME_LIMIT = 5.0  # Seconds of solver time per optimization
+DEGRADED_CANDIDATE_PRODUCTS = 2_000  # Subset size when all the solver workers are busy
+DEGRADED_TIME_LIMIT = 1.0  # Seconds of simplex when all the solver workers are busy
+
+
+def candidate_subset(A: np.ndarray, c: np.ndarray, groups: np.ndarray | None, limit: int) -> np.ndarray:
+    """Indices (sorted) of at most limit products (A is nutrients x products): the cheapest product of each group, then
+    the products by their best rank of nutrient per unit of cost over the nutrients (as the column generation seeds)."""
+    num_products = A.shape[1]
+    if num_products <= limit:
+        return np.arange(num_products)
+    per_cost = A / np.maximum(c, np.finfo(np.float64).tiny)
+    ranks = np.empty(A.shape, dtype=np.int64)
+    np.put_along_axis(ranks, np.argsort(-per_cost, axis=1, kind="stable"), np.arange(num_products), axis=1)
+    best_rank = ranks.min(axis=0, initial=num_products)
+    if groups is not None:
+        order = np.lexsort((c, groups))
+        first = np.ones(num_products, dtype=bool)
+        first[1:] = groups[order][1:] != groups[order][:-1]
+        best_rank[order[first & (groups[order] >= 0)]] = -1
+    return np.sort(np.argsort(best_rank, kind="stable")[:limit])
@@ -1,46 +1,107 @@
 #!/usr/bin/env -S uv run
 """This script creates a flask app for optimizing a diet with linear optimization to get the optimal quantities of food products.
 
-TODO: Advanced filter: vegan, vegetarian, indiviudal off categories
 TODO: Include other objectives with tunable hyperparameters (t.ex. minimize environmental impact, added sugar, saturated fat).
 TODO: In frontend button to download the results as a CSV file.
 TODO: Log all requests and responses in a database.
 TODO: Benchmark different LP solvers performance.
 """
 
+import bisect
+import calendar
 import csv
+import datetime
+import functools
 import io
 import json
 import math
 import re
+import signal
+import threading
 import time
 from collections.abc import Iterable
+from contextlib import suppress
+from dataclasses import dataclass
 from pathlib import Path
 from urllib.parse import unquote
 
 import duckdb
 import numpy as np
-from flask import Flask, make_response, render_template, request
+from flask import Flask, g, make_response, render_template, request
 from flask_compress import Compress
-from scipy.optimize import linprog
-
+from markupsafe import escape
+from scipy.optimize import OptimizeResult, linprog
+
+from dietdashboard.admission import (
+    DEGRADED_CANDIDATE_PRODUCTS,
+    DEGRADED_TIME_LIMIT,
+    MAX_CANDIDATE_PRODUCTS,
+    SOLVE_TIME_LIMIT,
+    candidate_subset,
+)
+from dietdashboard.colgen import COLUMN_GENERATION_MIN_PRODUCTS, solve_column_generation
+from dietdashboard.comparison import ComparisonMatrix
+from dietdashboard.diagnosis import diagnose_infeasibility
+from dietdashboard.encoding import CSV_MIMETYPE, available_mimetypes, encode
+from dietdashboard.executor import SolverBusy, SolverPool
+from dietdashboard.filters import FilterBitmaps
+from dietdashboard.household import MAX_MEMBERS, member_bounds, solve_household
+from dietdashboard.locations import MAX_NEAR_RADIUS_KM, NEAR_RADIUS_KM, LocationIndex
 from dietdashboard.objective import validate_objective_str
+from dietdashboard.pdlp import (
+    PDLP_ACCEPTED_ERROR,
+    PDLP_CROSSOVER,
+    PDLP_MAX_ITERATIONS,
+    PDLP_TIME_LIMIT,
+    PDLP_TOLERANCE,
+    solve_pdlp,
+)
+from dietdashboard.profiling import PROFILE_HEADER, profile_request, run_profiled
+from dietdashboard.ranges import achievable_ranges
+from dietdashboard.scaling import LP_SCALING, scale_problem, unscale_result
+from dietdashboard.search import MAX_SEARCH_LIMIT, SEARCH_LIMIT, SearchIndex
+from dietdashboard.sensitivity import reduced_costs, solution_duals, substitutes
+from dietdashboard.stores import STORES_TIME_LIMIT, solve_stores
 
 DEBUG_DIR = Path(__file__).parent.parent / "tmp"
 DATA_DIR = Path(__file__).parent.parent / "data"
+CURRENT_DATA = DATA_DIR / "current"  # Link to the live version, data/versions/<version> (see make data-release)
 TEMPLATE_FOLDER = Path(__file__).parent / "frontend/html"
 STATIC_FOLDER = Path(__file__).parent / "static"
 QUERY = (Path(__file__).parent.parent / "queries/query.sql").read_text()
+DISPLAY_QUERY = (Path(__file__).parent.parent / "queries/query_display.sql").read_text()
+PRICE_HISTORY_QUERY = (Path(__file__).parent.parent / "queries/price_history.sql").read_text()
 LP_METHOD = "revised simplex"
 CACHE_TIMEOUT = 60 * 10  # 10 minutes
 SQL_ERROR_COL_REF_REGEX = re.compile(r"Binder Error: Referenced column \"([a-zA-Z_]+)\" not found in FROM clause!")
 ACTIVE_THRESHOLD = 1e-3  # Threshold to consider a constraint as active
 PRODUCT_THRESHOLD = 1e-3  # Minimum quantity in grams to include a product in the output
-
-
-def get_con() -> duckdb.DuckDBPyConnection:
-    """Get a connection to the DuckDB database."""
-    return duckdb.connect(DATA_DIR / "data.db", read_only=True)
+RANGES_BUDGET = 10.0  # Default daily budget in EUR for the achievable nutrient ranges
+PRICE_POLICIES = ("latest", "median", "min")  # One price per product and location (see queries/price_columns.sql)
+PRICE_WINDOW_DAYS = 365  # Days of prices up to a snapshot, older ones only as a last known price in the current one
+RANGES_CACHE_SIZE = 64  # Number of computed ranges (location set, budget and bounds) kept in the ranges cache
+RANGES_ARRAYS_CACHE_SIZE = 2  # Location sets whose product matrix (all nutrients x products) is kept, can be large
+COMPARISON_CACHE_SIZE = 64  # Number of location sets kept in the comparison cache
+RELOAD_SIGNAL = signal.SIGUSR2  # Reloads the live data version (see make reload-data)
+MAX_LOCATION_IDS = 1000  # Locations looked up by id in one request (the selection of the map)
+ADMIN_ADDRESSES = ("127.0.0.1", "::1")  # Clients allowed to use the admin endpoints (and the profile header)
+PROFILED_ENDPOINTS = ("optimize", "household", "ranges")  # The requests that solve LPs, the only ones profiled
+
+
+def data_version() -> tuple[str, Path]:
+    """The live data version and its database: the version directory that data/current links to (see make
+    data-release), or without it data/data.db itself, versioned by its modification time. The databases are opened
+    read-only and never copied, only a release can be reloaded safely while it is served."""
+    if CURRENT_DATA.exists():
+        version_dir = CURRENT_DATA.resolve()
+        return version_dir.name, version_dir / "data.db"
+    db_path = DATA_DIR / "data.db"
+    return f"data.db@{db_path.stat().st_mtime_ns}", db_path
+
+
+def get_con(db_path: Path | None = None) -> duckdb.DuckDBPyConnection:
+    """Get a connection to the DuckDB database (of the live data version by default)."""
+    return duckdb.connect(db_path or data_version()[1], read_only=True)
 
 
 def validate_objective(con: duckdb.DuckDBPyConnection, objective_string: str) -> tuple[bool, str]:
@@ -71,25 +132,83 @@ def query_dicts(con: duckdb.DuckDBPyConnection, query: str, **kwargs) -> list[di
     return [{c: r for c, r in zip(cols, row, strict=True)} for row in con.fetchall()]
 
 
-def get_arrays(bounds: dict[str, tuple[float, float]], products_and_prices: dict[str, np.ndarray]) -> tuple[np.ndarray, ...]:
-    # Nutrients of each product
-    A_nutrients = np.array([products_and_prices[nutrient_id] for nutrient_id in bounds], dtype=np.float32)
-
-    # Costs of each product
-    c_costs = np.array(products_and_prices["objective"], dtype=np.float32)
-
-    # Bounds for nutrients
-    b = np.array([bounds[nutrient] for nutrient in bounds], dtype=np.float32)
-    lb, ub = b[:, 0], b[:, 1]
-
-    return A_nutrients, lb, ub, c_costs
-
-
-def solve_optimization(A, lb, ub, c):
-    # Concatenate contraints for lower bounds the upper bounds.
-    A_ub = np.vstack([-A, A])
-    b_ub = np.concatenate([-lb, ub])
-    return linprog(c, A_ub=A_ub, b_ub=b_ub, bounds=(0, None), method=LP_METHOD)
+def query_display_columns(con: duckdb.DuckDBPyConnection, price_ids: np.ndarray) -> dict[str, np.ndarray]:
+    """Look up the display columns of the chosen products after the solve, in the order of price_ids."""
+    display = query_numpy(con, DISPLAY_QUERY, price_ids=price_ids.tolist())
+    location_names = [", ".join(str(n).split(", ")[:3]) for n in display["location_osm_display_name"]]
+    return {
+        "id": price_ids,
+        "product_code": display["product_code"],
+        "product_name": display["product_name"],
+        "ciqual_name": display["ciqual_name"],
+        "ciqual_code": display["ciqual_code"],
+        "color": display["color"],
+        "location": np.array(location_names, dtype=object),
+        "location_osm_id": display["location_osm_id"],
+    }
+
+
+def select_snapshot(snapshots: list[datetime.date], as_of: str | None) -> datetime.date:
+    """The latest price snapshot on or before the as_of date (YYYY-MM-DD, or YYYY-MM for the end of the month), the
+    current (last) snapshot without a date."""
+    if not snapshots:
+        raise ValueError("No price snapshots, the price_columns table of the data is empty.")
+    if not as_of:
+        return snapshots[-1]
+    try:
+        if re.fullmatch(r"\d{4}-\d{2}", as_of):
+            year, month = map(int, as_of.split("-"))
+            date = datetime.date(year, month, calendar.monthrange(year, month)[1])
+        else:
+            date = datetime.date.fromisoformat(as_of)
+    except ValueError:
+        raise ValueError(f"Invalid as_of date {as_of}, expected YYYY-MM-DD or YYYY-MM.") from None
+    i = bisect.bisect_right(snapshots, date)
+    if i == 0:
+        raise ValueError(f"No price snapshot on or before {date}, the first is {snapshots[0]}.")
+    return snapshots[i - 1]
+
+
+def get_solver_arrays(
+    bounds: dict[str, tuple[float, float]], products_and_prices: dict[str, np.ndarray]
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Solver-ready float64 arrays: A_ub with the rows -A (lower bounds) and A (upper bounds), b_ub and the costs c.
+
+    The query returns the nutrients as DOUBLE, so the columns are stacked once, without conversion, into the lower
+    half of the preallocated A_ub (the nutrient matrix A, A_ub[len(bounds):], a view) and negated into its upper half.
+    """
+    num_nutrients, num_products = len(bounds), len(products_and_prices["objective"])
+    A_ub = np.empty((2 * num_nutrients, num_products), dtype=np.float64)
+    np.stack([products_and_prices[nutrient_id] for nutrient_id in bounds], out=A_ub[num_nutrients:])
+    np.negative(A_ub[num_nutrients:], out=A_ub[:num_nutrients])
+    b = np.array([bounds[nutrient] for nutrient in bounds], dtype=np.float64)
+    b_ub = np.concatenate([-b[:, 0], b[:, 1]])
+    c = np.asarray(products_and_prices["objective"], dtype=np.float64)  # Not copied, already float64
+    return A_ub, b_ub, c
+
+
+class TimeLimitReached(Exception):
+    """Raised by the simplex callback after the time limit."""
+
+
+def solve_optimization(A_ub, b_ub, c, scaling: bool = LP_SCALING, time_limit: float | None = None):
+    # The constraints for lower bounds and upper bounds are already concatenated in A_ub and b_ub.
+    # The simplex has no time limit option, its callback (called every iteration) stops it after the time limit.
+    deadline = time.perf_counter() + (time_limit if time_limit is not None else math.inf)
+
+    def stop_after_deadline(_):
+        if time.perf_counter() > deadline:
+            raise TimeLimitReached
+
+    callback = stop_after_deadline if time_limit is not None else None
+    try:
+        if not scaling:
+            return linprog(c, A_ub=A_ub, b_ub=b_ub, bounds=(0, None), method=LP_METHOD, callback=callback)
+        A_scaled, b_scaled, c_scaled, row_scale, col_scale = scale_problem(A_ub, b_ub, c)
+        result = linprog(c_scaled, A_ub=A_scaled, b_ub=b_scaled, bounds=(0, None), method=LP_METHOD, callback=callback)
+    except TimeLimitReached:
+        return OptimizeResult(status=1, message="The time limit was reached.", nit=0)
+    return unscale_result(result, row_scale, col_scale)
 
 
 def create_rangeslider(data: dict[str, str]) -> dict[str, float | str]:
@@ -112,16 +231,37 @@ def create_csv(fieldnames: list[str], data: Iterable[dict[str, str]]) -> str:
     return output.getvalue()
 
 
-def create_app() -> Flask:
-    # TODO: serve static files with Caddy
-    app = Flask(__name__, static_folder=STATIC_FOLDER, template_folder=TEMPLATE_FOLDER)
-    app.config["COMPRESS_MIMETYPES"] = ["text/html", "text/css", "text/javascript", "text/csv", "text/plain"]
-    Compress(app)
-    con = get_con()
+@dataclass(eq=False)
+class DataState:
+    """Everything the app loads from one data version, replaced as a whole on reload. States are equal (and hash, as
+    in the cache keys) by their data version, so that cached results of another version are never served."""
+
+    version: str
+    db_path: Path
+    nutrient_ids: list[str]
+    recommendations_by_id: dict[str, dict[str, str]]
+    slider_csv: str
+    grouped_nutrients: list[dict[str, str]]
+    filter_bitmaps: FilterBitmaps
+    snapshots: list[datetime.date]
+    search_index: SearchIndex
+    location_index: LocationIndex
+    location_names: dict[int, str]
+    comparison_matrix: ComparisonMatrix
+
+    def __hash__(self) -> int:
+        return hash(self.version)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, DataState) and self.version == other.version
+
+
+def load_data(version: str, db_path: Path) -> DataState:
+    """Build the sliders, the nutrients of the info page and the indexes of a data version."""
+    con = get_con(db_path)
 
     # Create sliders
     recommendations = query_dicts(con=con, query="""SELECT * FROM recommendations""")
-    nutrient_ids = [row["id"] for row in recommendations]
     sliders = [{k: rec[k] for k in ("id", "name", "unit", "nutrient_type")} | create_rangeslider(rec) for rec in recommendations]
     slider_csv = create_csv(["id", "name", "unit", "nutrient_type", "min", "max", "lower", "upper", "active"], sliders)  # type: ignore[reportArgumentType]
 
@@ -132,138 +272,690 @@ def create_app() -> Flask:
     order = {nt: i for i, nt in enumerate(["energy", "macro", "sugar", "fatty_acid", "mineral", "vitamin", "other"])}
     grouped_nutrients.sort(key=lambda x: order.get(x["nutrient_type"], len(order)))
 
+    location_index = LocationIndex(con)
+    state = DataState(
+        version=version,
+        db_path=db_path,
+        nutrient_ids=[row["id"] for row in recommendations],
+        recommendations_by_id={row["id"]: row for row in recommendations},
+        slider_csv=slider_csv,
+        grouped_nutrients=grouped_nutrients,
+        filter_bitmaps=FilterBitmaps(con),
+        snapshots=[row[0] for row in con.sql("SELECT DISTINCT as_of FROM price_columns ORDER BY as_of").fetchall()],
+        search_index=SearchIndex(con),
+        location_index=location_index,
+        location_names={int(i): str(n).split(", ")[0] for i, n in zip(location_index.ids, location_index.names, strict=True)},
+        comparison_matrix=ComparisonMatrix(con),
+    )
     con.close()
+    return state
+
+
+def create_app() -> Flask:
+    # TODO: serve static files with Caddy
+    app = Flask(__name__, static_folder=STATIC_FOLDER, template_folder=TEMPLATE_FOLDER)
+    app.config["COMPRESS_MIMETYPES"] = ["text/html", "text/css", "text/javascript", "text/csv", "text/plain"]
+    Compress(app)
+    solver_pool = SolverPool()
+
+    # The live data, a request reads it once and keeps that state even if a reload switches to another version
+    live = load_data(*data_version())
+    reload_lock = threading.Lock()
+    reload_status: dict[str, str | float | None] = {"loading": None, "error": None, "load_time": None}
+
+    def reload_data() -> None:
+        """Load the live data version (if new) and switch to it once everything is built, on failure keep the old one."""
+        nonlocal live
+        if not reload_lock.acquire(blocking=False):
+            return  # A reload is already running
+        try:
+            version, db_path = data_version()
+            if version == live.version:
+                return
+            reload_status["loading"] = version
+            start = time.perf_counter()
+            state = load_data(version, db_path)
+            live = state
+            for cache in (location_set_arrays, cached_ranges, cached_comparison):
+                cache.cache_clear()  # Frees the old version, its keys would not be served again
+            reload_status["load_time"], reload_status["error"] = time.perf_counter() - start, None
+            app.logger.info("Switched to data version %s", version)
+        except Exception as e:  # Any failure keeps the old version serving
+            reload_status["error"] = f"{type(e).__name__}: {e}"
+            app.logger.exception("Loading the data failed, keeping version %s", live.version)
+        finally:
+            reload_status["loading"] = None
+            reload_lock.release()
+
+    def start_reload() -> None:
+        threading.Thread(target=reload_data, name="data-reload", daemon=True).start()
+
+    with suppress(ValueError):  # Signals can only be set from the main thread, the admin endpoint works regardless
+        signal.signal(RELOAD_SIGNAL, lambda _signum, _frame: start_reload())
+
+    def near_locations(state: DataState, near: dict) -> list[int]:
+        """Ids of the locations within the radius (km) of the point, e.g. {"lat": 43.6, "lon": 1.44, "radius_km": 5}."""
+        try:
+            lat, lon = float(near["lat"]), float(near["lon"])
+            radius_km = float(near.get("radius_km", NEAR_RADIUS_KM))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Invalid near, expected {'lat': ..., 'lon': ..., 'radius_km': ...}.") from None
+        if not 0 < radius_km <= MAX_NEAR_RADIUS_KM:
+            raise ValueError(f"The radius must be positive and at most {MAX_NEAR_RADIUS_KM} km.")
+        positions, _ = state.location_index.near(lat, lon, radius_km)
+        return state.location_index.ids[positions].tolist()
+
+    def requested_locations(state: DataState, data: dict) -> list[int]:
+        """The locations of a request, given as ids or as all the stores near a point."""
+        if data.get("near"):
+            return near_locations(state, data["near"])
+        return [int(loc) for loc in data.get("locations", [])]
+
+    # Profiles of the solves of sampled requests (or with the profile header), see dietdashboard/profiling.py
+    def profile_folder() -> Path:
+        """The debug folder of the request, or a folder of its own for the requests without one."""
+        if "debug_folder" not in g:
+            g.debug_folder = DEBUG_DIR / f"profile/{time.strftime('%Y-%m-%d-%H-%M-%S')}-{time.perf_counter_ns()}"
+            g.debug_folder.mkdir(parents=True)
+        return g.debug_folder
+
+    @app.before_request
+    def start_profile():
+        # Inline solves (no solver workers) would run in the shared request process, they are not profiled
+        if request.endpoint in PROFILED_ENDPOINTS and solver_pool.workers > 0:
+            requested = PROFILE_HEADER in request.headers and request.remote_addr in ADMIN_ADDRESSES
+            g.profile = profile_request(requested)
+
+    def solve(fn, *args, **kwargs):
+        """Run fn in the solver pool, with a profile of the solve in the worker process when the request is profiled."""
+        if not g.get("profile"):
+            return solver_pool.run(fn, *args, **kwargs)
+        g.num_solves = g.get("num_solves", 0) + 1
+        path = profile_folder() / f"solve_{g.num_solves}_{fn.__name__}.out"
+        return solver_pool.run(run_profiled, path, fn, *args, **kwargs)
+
+    def admit(debug_folder: Path | None, num_candidates: int, requested_time_limit: float | None) -> tuple[str, float, int]:
+        """Admission of a solve request (see dietdashboard/admission.py): its admission, time limit and maximum number of
+        candidate products, a full solver queue is rejected before the solve (with a 503)."""
+        if solver_pool.full:
+            if debug_folder is not None:
+                times = {"admission": "rejected", "queue_depth": solver_pool.depth, "num_candidates": num_candidates}
+                (debug_folder / "times.json").write_text(json.dumps(times, indent=2))
+            raise solver_pool.reject()
+        time_limit = min(SOLVE_TIME_LIMIT if requested_time_limit is None else float(requested_time_limit), SOLVE_TIME_LIMIT)
+        if solver_pool.busy:
+            return "degraded", min(time_limit, DEGRADED_TIME_LIMIT), DEGRADED_CANDIDATE_PRODUCTS
+        return "admitted", time_limit, MAX_CANDIDATE_PRODUCTS
+
+    @app.errorhandler(SolverBusy)
+    def solver_busy(e: SolverBusy):
+        return str(e), 503, {"Retry-After": str(e.retry_after)}
+
+    @app.route("/status", methods=["GET"])
+    def status():
+        """Solves running and queued in the solver pool of this app process, and its data version."""
+        return app.json.response({"solver_pool": solver_pool.status(), "data": {"version": live.version, **reload_status}})
+
+    @app.route("/admin/reload", methods=["POST"])
+    def admin_reload():
+        """Reload the live data version in the background (as the reload signal), only from the admin addresses."""
+        if request.remote_addr not in ADMIN_ADDRESSES:
+            return "Forbidden", 403
+        start_reload()
+        return app.json.response({"version": live.version, **reload_status}), 202
 
     @app.route("/")
     def index():
-        return render_template("dashboard.html", slider_csv=slider_csv)
+        return render_template("dashboard.html", slider_csv=live.slider_csv)
 
     @app.route("/validate_objective", methods=["GET"])
     def validate():
         """Validate the objective function expression."""
         objective_string = request.args.get("q", "")
-        with get_con() as con:
+        with get_con(live.db_path) as con:
             valid, message = validate_objective(con, unquote(objective_string))  # unquote to decode URL-encoded characters
         return app.json.response({"valid": valid, "message": message})
 
+    def infeasible_response(state: DataState, relaxations: list[dict] | None, message: str):
+        """Explain which bounds to relax, the relaxations are also sent as JSON in the Bound-Relaxations header."""
+        if not relaxations:
+            return f"Optimization failed: {message}"
+        items = []
+        for r in relaxations:
+            rec = state.recommendations_by_id[r["nutrient_id"]]
+            change = "Lower" if r["bound"] == "lower" else "Raise"
+            items.append(
+                f"<li>{change} the {r['bound']} bound of {escape(rec['name'])} from {r['value']:.4g} "
+                f"to {r['relaxed_value']:.4g} {escape(rec['unit'])}</li>"
+            )
+        response = make_response(
+            f"Optimization failed: the selected products cannot meet all nutrient targets. "
+            f"Relaxing these bounds makes it feasible:<ul>{''.join(items)}</ul>"
+        )
+        response.headers["Bound-Relaxations"] = json.dumps(relaxations)
+        return response
+
     @app.route("/optimize.csv", methods=["POST"])
     def optimize():
+        state = live
         data = request.get_json()
         objective = data["objective"]
-        con = get_con()
-        valid, message = validate_objective(con, objective)
-        if not valid:
-            return f"Invalid objective function: {message}"
-        debug_folder = DEBUG_DIR / f"optimize/{time.strftime('%Y-%m-%d-%H-%M-%S')}-{time.perf_counter_ns()}"
-        debug_folder.mkdir(parents=True)
-        with (debug_folder / "input.json").open("w+") as f:
-            f.write(json.dumps(data, indent=2))
-        chosen_bounds = {
-            nid: (data.get(f"{nid}_lower"), data.get(f"{nid}_upper"))
-            for nid in nutrient_ids
-            if f"{nid}_lower" in data and f"{nid}_upper" in data
-        }
-        if not chosen_bounds:
-            return "No nutrients selected."
-        locations = [int(loc) for loc in data["locations"]]  # id: 154, name: Auchan, Rue Lieutenant André Argenton
-        if not locations:
-            return "No locations selected."
+        with get_con(state.db_path) as con:  # Closed after the products query, the solve does not need it
+            valid, message = validate_objective(con, objective)
+            if not valid:
+                return f"Invalid objective function: {message}"
+            debug_folder = DEBUG_DIR / f"optimize/{time.strftime('%Y-%m-%d-%H-%M-%S')}-{time.perf_counter_ns()}"
+            debug_folder.mkdir(parents=True)
+            g.debug_folder = debug_folder  # Also holds the profiles of the request
+            with (debug_folder / "input.json").open("w+") as f:
+                f.write(json.dumps(data, indent=2))
+            chosen_bounds = {
+                nid: (data.get(f"{nid}_lower"), data.get(f"{nid}_upper"))
+                for nid in state.nutrient_ids
+                if f"{nid}_lower" in data and f"{nid}_upper" in data
+            }
+            if not chosen_bounds:
+                return "No nutrients selected."
+            try:  # id: 154, name: Auchan, Rue Lieutenant André Argenton, or near: {"lat": 43.6, "lon": 1.44, "radius_km": 5}
+                locations = requested_locations(state, data)
+            except ValueError as e:
+                return str(e)
+            if not locations:
+                return "No locations selected."
+            price_policy = data.get("price_policy", PRICE_POLICIES[0])
+            if price_policy not in PRICE_POLICIES:
+                return f"Unknown price policy {price_policy}, available policies: {', '.join(PRICE_POLICIES)}"
+            try:  # Prices as of a date, e.g. "2025-03" for the end of March, from the monthly snapshots
+                as_of = select_snapshot(state.snapshots, str(data["as_of"]) if data.get("as_of") else None)
+            except ValueError as e:
+                return str(e)
+            price_window = f"{as_of - datetime.timedelta(days=PRICE_WINDOW_DAYS)}/{as_of}"  # ISO 8601 interval
+
+            # Filters, e.g. {"diet": ["vegan"], "nova": [1, 2]} and exclusions, e.g. {"allergen": ["en:gluten"]}
+            include, exclude = data.get("filters", {}), data.get("exclude", {})
+            try:
+                filter_mask = state.filter_bitmaps.combine(include, exclude) if include or exclude else None
+            except ValueError as e:
+                return str(e)
+            excluded_price_ids = np.array([int(i) for i in data.get("exclude_price_ids", [])], dtype=np.int64)  # From /search
+
+            start = time.perf_counter()
+            q = QUERY.replace("$objective", objective)  # Replace the placeholder with the actual objective function
+            chosen_nutrient_ids = [nid for nid in state.nutrient_ids if nid in chosen_bounds]
+            num_nutrients = len(chosen_nutrient_ids)
+            products_and_prices = query_numpy(
+                con, q, locations=locations, nutrient_ids=chosen_nutrient_ids, policy=price_policy, as_of=as_of
+            )
+            query_time = time.perf_counter() - start
 
         start = time.perf_counter()
-        q = QUERY.replace("$objective", objective)  # Replace the placeholder with the actual objective function
-        chosen_nutrient_ids = [nid for nid in nutrient_ids if nid in chosen_bounds]
-        num_nutrients = len(chosen_nutrient_ids)
-        products_and_prices = query_numpy(con, q, locations=locations, nutrient_ids=chosen_nutrient_ids)
-        query_time = time.perf_counter() - start
-        con.close()
+        if filter_mask is not None or len(excluded_price_ids):
+            excluded_price_ids = state.search_index.same_column(excluded_price_ids)  # Any price of the product and location
+            keep = np.isin(products_and_prices["price_id"], excluded_price_ids, invert=True)
+            if filter_mask is not None:
+                keep &= state.filter_bitmaps.select(filter_mask, products_and_prices["price_id"])
+            products_and_prices = {k: v[keep] for k, v in products_and_prices.items()}
+        filter_time = time.perf_counter() - start
 
         start = time.perf_counter()
-        A_nutrients, lb, ub, c_costs = get_arrays(chosen_bounds, products_and_prices)
+        A_ub, b_ub, c_costs = get_solver_arrays(chosen_bounds, products_and_prices)
+        A_nutrients, lb, ub = A_ub[num_nutrients:], -b_ub[:num_nutrients], b_ub[num_nutrients:]
         array_time = time.perf_counter() - start
 
         if A_nutrients.size == 0:
             return "No products found."
 
+        # Admission control (see dietdashboard/admission.py), busy solver workers get a short simplex solve
+        num_candidates = A_nutrients.shape[1]
+        admission, time_limit, candidate_limit = admit(debug_folder, num_candidates, data.get("time_limit"))
+        solver = "simplex" if admission == "degraded" else data.get("solver", "simplex")
+        subset = num_candidates > candidate_limit
+        if subset:
+            start = time.perf_counter()
+            groups = products_and_prices["ciqual_subgroup_code"]
+            keep = candidate_subset(A_nutrients, c_costs, groups, candidate_limit)
+            products_and_prices = {k: v[keep] for k, v in products_and_prices.items()}
+            A_ub, c_costs = A_ub[:, keep], c_costs[keep]
+            A_nutrients = A_ub[num_nutrients:]
+            array_time += time.perf_counter() - start
+
+        # Column generation prices all the products with the duals of a small master LP, for large location sets.
+        # The first-order solver gives an approximate answer within a time budget, e.g. {"solver": "pdlp", "pdlp": {...}}
+        default_column_generation = A_nutrients.shape[1] >= COLUMN_GENERATION_MIN_PRODUCTS
+        column_generation = (
+            solver != "pdlp" and admission != "degraded" and bool(data.get("column_generation", default_column_generation))
+        )
+        queue_depth = solver_pool.depth
         start = time.perf_counter()
-        result = solve_optimization(A_nutrients, lb, ub, c_costs)
+        if solver == "pdlp":
+            options = data.get("pdlp", {})
+            result = solve(
+                solve_pdlp,
+                A_ub,
+                b_ub,
+                c_costs,
+                tolerance=float(options.get("tolerance", PDLP_TOLERANCE)),
+                max_iterations=int(options.get("max_iterations", PDLP_MAX_ITERATIONS)),
+                time_limit=min(float(options.get("time_limit", PDLP_TIME_LIMIT)), time_limit),
+                crossover=bool(options.get("crossover", PDLP_CROSSOVER)),
+            )
+        elif column_generation:
+            groups = products_and_prices["ciqual_subgroup_code"]
+            result = solve(solve_column_generation, A_ub, b_ub, c_costs, groups, time_limit=time_limit)
+        else:
+            result = solve(solve_optimization, A_ub, b_ub, c_costs, time_limit=time_limit)
         optimization_time = time.perf_counter() - start
-        (debug_folder / "times.json").write_text(
-            json.dumps(
-                {
-                    "query_time": query_time,
-                    "array_time": array_time,
-                    "optimization_time": optimization_time,
-                    "num_products": A_nutrients.shape[1],
-                    "num_nutrients": num_nutrients,
-                },
-                indent=2,
+        times = {
+            "data_version": state.version,
+            "profiled": g.get("profile", False),
+            "as_of": as_of.isoformat(),
+            "price_window": price_window,
+            "query_time": query_time,
+            "filter_time": filter_time,
+            "array_time": array_time,
+            "optimization_time": optimization_time,
+            "queue_depth": queue_depth,
+            "admission": admission,
+            "candidate_subset": subset,
+            "time_limit": time_limit,
+            "iterations": int(result.nit),
+            "num_candidates": num_candidates,
+            "num_products": A_nutrients.shape[1],
+            "num_nutrients": num_nutrients,
+        }
+        if solver == "pdlp":
+            times["kkt_error"] = result.kkt_error
+            times["converged"] = result.status == 0
+        if column_generation:
+            times["column_generation_rounds"] = int(result.rounds)
+            times["column_generation_columns"] = int(result.get("num_columns", 0))
+        if result.status == 2 and subset:  # The full set of candidates may meet the bounds, do not diagnose the subset
+            (debug_folder / "times.json").write_text(json.dumps(times, indent=2))
+            return (
+                f"Optimization failed: the {candidate_limit} products kept of the {num_candidates} candidates "
+                "cannot meet all nutrient targets, select fewer locations."
             )
+        if result.status == 2:  # Infeasible, find which bounds to relax with an elastic version of the LP
+            start = time.perf_counter()
+            relaxations = solve(diagnose_infeasibility, A_ub, b_ub, chosen_nutrient_ids)
+            times["diagnosis_time"] = time.perf_counter() - start
+            (debug_folder / "times.json").write_text(json.dumps(times, indent=2))
+            (debug_folder / "relaxations.json").write_text(json.dumps(relaxations, indent=2))
+            return infeasible_response(state, relaxations, result.message)
+        # Approximate answers within the time limit: PDLP close enough to the optimum, the last column generation master
+        approximate = result.status == 1 and (
+            (solver == "pdlp" and result.kkt_error <= PDLP_ACCEPTED_ERROR) or (column_generation and result.get("x") is not None)
         )
-        if result.status != 0:
+        times["approximate"] = approximate
+        if column_generation:
+            times["converged"] = result.status == 0
+        if result.status != 0 and not approximate:
+            (debug_folder / "times.json").write_text(json.dumps(times, indent=2))
             return f"Optimization failed: {result.message}"
 
+        # Fewer stores: a cost per store visited (in the unit of the objective) and/or a maximum number of stores
+        lp_result = result
+        store_cost, max_stores = float(data.get("store_cost", 0)), data.get("max_stores")
+        if store_cost > 0 or max_stores is not None:
+            start = time.perf_counter()
+            result = solve(
+                solve_stores,
+                A_ub,
+                b_ub,
+                c_costs,
+                products_and_prices["location_id"],
+                result.x,
+                store_cost=store_cost,
+                max_stores=int(max_stores) if max_stores is not None else None,
+                time_limit=min(float(data.get("stores_time_limit", STORES_TIME_LIMIT)), time_limit),
+            )
+            times["stores_time"] = time.perf_counter() - start
+            if result.status != 0:
+                (debug_folder / "times.json").write_text(json.dumps(times, indent=2))
+                return f"Optimization failed: {result.message}"
+            times["stores_method"] = result.method
+            times["num_stores"] = len(result.stores)
+            times["store_cost"] = result.store_cost
+
         # Calculate nutrient levels
         nutrients_levels = A_nutrients * result.x
         assert (nutrients_levels < -1e-7).sum() == 0, "Negative values in nutrients_levels."
 
         # Determine which constraints are active, when slack is close to 0, the constraint is active
         # assert len(result.slack) == 2 * len(chosen_bounds)
-        active_constraints = [
-            {"nutrient_id": chosen_nutrient_ids[i % num_nutrients]}
-            for i, slack in enumerate(result.slack)
-            if abs(slack) <= ACTIVE_THRESHOLD
-        ]
+        active = np.flatnonzero(np.abs(result.slack) <= ACTIVE_THRESHOLD)
+        active_constraints = [{"nutrient_id": chosen_nutrient_ids[i % num_nutrients]} for i in active]
 
         x = result.x
         # Sort by quantity and remove those with zero quantity
         indices = np.argsort(x)[::-1]
         indices = indices[x[indices] > PRODUCT_THRESHOLD]
 
-        fieldnames = [
-            "id",
-            "product_code",
-            "product_name",
-            "ciqual_name",
-            "ciqual_code",
-            "color",
-            "location",
-            "location_osm_id",
-            "quantity_g",
-            "price",
-            *list(chosen_bounds),
-        ]
-        optimal_products = []
-        for i in indices:
-            location = ", ".join(str(products_and_prices["location_osm_display_name"][i]).split(", ")[:3])
-            product = {
-                "id": int(products_and_prices["price_id"][i]),
-                "product_code": products_and_prices["product_code"][i],
-                "product_name": products_and_prices["product_name"][i],
-                "ciqual_name": products_and_prices["ciqual_name"][i],
-                "ciqual_code": products_and_prices["ciqual_code"][i],
-                "color": products_and_prices["color"][i],
-                "location": location,
-                "location_osm_id": products_and_prices["location_osm_id"][i],
-                "quantity_g": round(100 * x[i], 1),
-                "price": round(products_and_prices["price"][i] * x[i], 2),
-                **{nutrient_id: nutrients_levels[j, i].round(4) for j, nutrient_id in enumerate(chosen_bounds)},
-            }
-            optimal_products.append(product)
-        result_csv_string = create_csv(fieldnames, optimal_products)
-        (debug_folder / "output.csv").write_text(result_csv_string)  # Write the CSV to the debug folder
-        response = make_response(result_csv_string)
-        response.mimetype = "text/csv"
+        # Substitutes of each chosen product among the same Ciqual food, ranked by reduced cost. The duals are those of
+        # the LP, they do not price a basket changed by the stores, which then gets no substitutes
+        start = time.perf_counter()
+        times["substitutes"] = result is lp_result or np.allclose(result.x, lp_result.x, atol=PRODUCT_THRESHOLD)
+        if times["substitutes"]:
+            y = solution_duals(lp_result, A_ub, b_ub, c_costs, PRODUCT_THRESHOLD)
+            reduced = reduced_costs(A_ub, c_costs, y)
+            substitute_indices = substitutes(reduced, indices, products_and_prices["ciqual_code"])
+        else:
+            reduced = np.zeros(len(c_costs))
+            substitute_indices = [np.array([], dtype=np.intp) for _ in indices]
+        times["sensitivity_time"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        price_ids = products_and_prices["price_id"].astype(np.int64)
+        display_ids = np.unique(price_ids[np.concatenate([indices, *substitute_indices])])
+        with get_con(state.db_path) as con:
+            all_display = query_display_columns(con, display_ids)
+        position = {price_id: i for i, price_id in enumerate(display_ids)}
+        display = {name: column[[position[i] for i in price_ids[indices]]] for name, column in all_display.items()}
+        times["display_time"] = time.perf_counter() - start
+        (debug_folder / "times.json").write_text(json.dumps(times, indent=2))
+
+        product_index = np.repeat(indices, [len(subs) for subs in substitute_indices])
+        substitute_index = np.concatenate([np.array([], dtype=np.intp), *substitute_indices])
+        substitute_table = {
+            "product_id": price_ids[product_index],
+            "substitute_id": price_ids[substitute_index],
+            "product_name": all_display["product_name"][[position[i] for i in price_ids[substitute_index]]],
+            "reduced_cost": reduced[substitute_index],
+            "objective": c_costs[substitute_index],
+            "entering_objective": c_costs[substitute_index] - reduced[substitute_index],
+        }
+
+        optimal_products = {
+            **display,
+            "quantity_g": np.round(100 * x[indices], 1),
+            "price": np.round(products_and_prices["price"][indices] * x[indices], 2),
+            **{nutrient_id: nutrients_levels[j, indices].round(4) for j, nutrient_id in enumerate(chosen_bounds)},
+            # In the body (a header would outgrow the server limits), the substitutes table has their reduced costs
+            "substitute_ids": np.array([" ".join(map(str, price_ids[subs])) for subs in substitute_indices], dtype=object),
+        }
+        levels = {
+            "nutrient_id": np.array(chosen_nutrient_ids, dtype=object),
+            "level": nutrients_levels.sum(axis=1, dtype=np.float64),
+            "lower": lb,
+            "upper": ub,
+        }
+        constraints = {
+            "nutrient_id": np.array([c["nutrient_id"] for c in active_constraints], dtype=object),
+            "bound": np.where(active < num_nutrients, "lower", "upper").astype(object),
+        }
+        tables = {"products": optimal_products, "levels": levels, "constraints": constraints, "substitutes": substitute_table}
+
+        # Negotiate the response format, browsers accepting anything get CSV
+        mimetype = request.accept_mimetypes.best_match(available_mimetypes(), default=CSV_MIMETYPE)
+        body = encode(mimetype, tables, {"active_constraints": active_constraints, "timings": times})
+        if mimetype == CSV_MIMETYPE:
+            (debug_folder / "output.csv").write_text(body)  # type: ignore[reportArgumentType]  # Write the CSV to the debug folder
+        response = make_response(body)
+        response.mimetype = mimetype
         response.headers["Binding-Constraints"] = json.dumps(active_constraints)
+        # In a past snapshot products without a price in the window are not candidates (see queries/price_columns.sql)
+        response.headers["Price-Window"] = price_window
+        if approximate:  # Stopped by a limit, not proven optimal (see converged and kkt_error in the timings)
+            response.headers["Approximate"] = "true"
+        if "kkt_error" in times:
+            response.headers["KKT-Error"] = f"{times['kkt_error']:.3g}"
+        return response
+
+    @app.route("/household.csv", methods=["POST"])
+    def household():
+        """Optimize one shared basket for several people, each with the nutrient bounds of their sex (or their own)."""
+        state = live
+        data = request.get_json()
+        objective = data["objective"]
+        members = data.get("members", [])
+        if not members:
+            return "No household members given."
+        if len(members) > MAX_MEMBERS:
+            return f"At most {MAX_MEMBERS} household members are supported."
+        chosen_nutrient_ids = [nid for nid in state.nutrient_ids if nid in set(data.get("nutrients", []))]
+        if not chosen_nutrient_ids:
+            return "No nutrients selected."
+        try:
+            locations = requested_locations(state, data)
+        except ValueError as e:
+            return str(e)
+        if not locations:
+            return "No locations selected."
+        try:
+            lb, ub = member_bounds(state.recommendations_by_id, chosen_nutrient_ids, members)
+        except ValueError as e:
+            return str(e)
+        price_policy = data.get("price_policy", PRICE_POLICIES[0])
+        if price_policy not in PRICE_POLICIES:
+            return f"Unknown price policy {price_policy}, available policies: {', '.join(PRICE_POLICIES)}"
+        with get_con(state.db_path) as con:
+            valid, message = validate_objective(con, objective)
+            if not valid:
+                return f"Invalid objective function: {message}"
+            debug_folder = DEBUG_DIR / f"household/{time.strftime('%Y-%m-%d-%H-%M-%S')}-{time.perf_counter_ns()}"
+            debug_folder.mkdir(parents=True)
+            g.debug_folder = debug_folder  # Also holds the profiles of the request
+            (debug_folder / "input.json").write_text(json.dumps(data, indent=2))
+
+            start = time.perf_counter()
+            q = QUERY.replace("$objective", objective)
+            products_and_prices = query_numpy(
+                con, q, locations=locations, nutrient_ids=chosen_nutrient_ids, policy=price_policy, as_of=None
+            )
+            query_time = time.perf_counter() - start
+
+        A_nutrients = np.stack([products_and_prices[nid] for nid in chosen_nutrient_ids])
+        if A_nutrients.size == 0:
+            return "No products found."
+        # Admission control as for /optimize.csv: the LP has one block of columns per distinct member
+        num_candidates = A_nutrients.shape[1]
+        admission, time_limit, candidate_limit = admit(debug_folder, num_candidates, data.get("time_limit"))
+        subset = num_candidates > candidate_limit
+        if subset:
+            groups = products_and_prices["ciqual_subgroup_code"]
+            keep = candidate_subset(A_nutrients, products_and_prices["objective"], groups, candidate_limit)
+            products_and_prices = {k: v[keep] for k, v in products_and_prices.items()}
+            A_nutrients = A_nutrients[:, keep]
+        start = time.perf_counter()
+        result, x, allocations = solve(
+            solve_household, A_nutrients, lb, ub, products_and_prices["objective"], time_limit=time_limit
+        )
+        optimization_time = time.perf_counter() - start
+        times = {
+            "query_time": query_time,
+            "optimization_time": optimization_time,
+            "admission": admission,
+            "candidate_subset": subset,
+            "time_limit": time_limit,
+            "num_candidates": num_candidates,
+            "num_products": A_nutrients.shape[1],
+            "num_nutrients": len(chosen_nutrient_ids),
+            "num_members": len(members),
+            "num_blocks": len({tuple(row) for row in np.hstack([lb, ub])}),
+        }
+        if result.status != 0:
+            (debug_folder / "times.json").write_text(json.dumps(times, indent=2))
+            return f"Optimization failed: {result.message}"
+
+        indices = np.argsort(x)[::-1]
+        indices = indices[x[indices] > PRODUCT_THRESHOLD]
+        start = time.perf_counter()
+        with get_con(state.db_path) as con:
+            display = query_display_columns(con, products_and_prices["price_id"][indices].astype(np.int64))
+        times["display_time"] = time.perf_counter() - start
+        (debug_folder / "times.json").write_text(json.dumps(times, indent=2))
+
+        basket = {
+            **display,
+            "quantity_g": np.round(100 * x[indices], 1),
+            "price": np.round(products_and_prices["price"][indices] * x[indices], 2),
+            **{f"member_{i}_quantity_g": np.round(100 * allocations[i, indices], 1) for i in range(len(members))},
+        }
+        member_levels = allocations @ A_nutrients.T  # members x nutrients
+        levels = {
+            "member": np.repeat(np.arange(len(members)), len(chosen_nutrient_ids)),
+            "nutrient_id": np.array(chosen_nutrient_ids * len(members), dtype=object),
+            "level": member_levels.ravel(),
+            "lower": lb.ravel(),
+            "upper": ub.ravel(),
+        }
+        mimetype = request.accept_mimetypes.best_match(available_mimetypes(), default=CSV_MIMETYPE)
+        body = encode(mimetype, {"products": basket, "levels": levels}, {"timings": times})
+        response = make_response(body)
+        response.mimetype = mimetype
         return response
 
+    @functools.lru_cache(maxsize=RANGES_ARRAYS_CACHE_SIZE)  # Only for the bounds changed on the same location set
+    def location_set_arrays(state: DataState, locations: tuple[int, ...]) -> tuple[np.ndarray, np.ndarray]:
+        """Nutrients (all nutrients x products) and prices of the products at the locations."""
+        with get_con(state.db_path) as con:
+            q = QUERY.replace("$objective", "price")
+            products_and_prices = query_numpy(
+                con, q, locations=list(locations), nutrient_ids=state.nutrient_ids, policy=PRICE_POLICIES[0], as_of=None
+            )
+        A = np.stack([products_and_prices[nid] for nid in state.nutrient_ids])
+        return A, products_and_prices["objective"]
+
+    @functools.lru_cache(maxsize=RANGES_CACHE_SIZE)
+    def cached_ranges(
+        state: DataState,
+        locations: tuple[int, ...],
+        budget: float,
+        bounds: tuple[tuple[float, float], ...],
+        candidate_limit: int,
+        time_limit: float,
+    ) -> dict:
+        """Ranges over at most candidate_limit products, a TimeoutError past the time limit is not cached."""
+        A, price = location_set_arrays(state, locations)
+        if A.shape[1] == 0:
+            return {}
+        if A.shape[1] > candidate_limit:
+            keep = candidate_subset(A, price, None, candidate_limit)
+            A, price = A[:, keep], price[keep]
+        b = np.array(bounds, dtype=np.float64).reshape(-1, 2)
+        low, high = solve(achievable_ranges, A, price, budget, b[:, 0], b[:, 1], time_limit=time_limit)
+        return {
+            nid: {"min": None if np.isnan(lo) else float(lo), "max": None if np.isnan(hi) else float(hi)}
+            for nid, lo, hi in zip(state.nutrient_ids, low, high, strict=True)
+        }
+
+    @app.route("/ranges", methods=["POST"])
+    def ranges():
+        """Achievable range of each nutrient at the locations within the budget, given the bounds of the other nutrients."""
+        state = live
+        data = request.get_json()
+        try:
+            locations = tuple(sorted(set(requested_locations(state, data))))
+        except ValueError as e:
+            return str(e)
+        if not locations:
+            return "No locations selected."
+        budget = float(data.get("budget", RANGES_BUDGET))
+        bounds = tuple(
+            (
+                float(data.get(f"{nid}_lower") or 0),
+                float(data[f"{nid}_upper"]) if data.get(f"{nid}_upper") is not None else math.inf,
+            )
+            for nid in state.nutrient_ids
+        )
+        # Admission control as for /optimize.csv (2 LPs per nutrient), the same request is cached per admission
+        num_candidates = location_set_arrays(state, locations)[0].shape[1]
+        admission, time_limit, candidate_limit = admit(None, num_candidates, data.get("time_limit"))
+        try:
+            result = cached_ranges(state, locations, budget, bounds, candidate_limit, time_limit)
+        except TimeoutError as e:
+            return str(e)
+        if not result:
+            return "No products found."
+        return app.json.response({
+            "budget": budget,
+            "ranges": result,
+            "admission": admission,
+            "candidate_subset": num_candidates > candidate_limit,
+        })
+
+    @app.route("/filters", methods=["GET"])
+    def filters():
+        """The values of each filter that can be used in the filters and exclude of /optimize.csv."""
+        return app.json.response(live.filter_bitmaps.values)
+
+    @app.route("/search", methods=["GET"])
+    def search():
+        """Search the products by name, Ciqual name and categories, e.g. /search?q=pain compl&locations=154,160"""
+        query = request.args.get("q", "")
+        locations = [int(loc) for loc in request.args.get("locations", "").split(",") if loc] or None
+        limit = min(request.args.get("limit", SEARCH_LIMIT, type=int), MAX_SEARCH_LIMIT)
+        start = time.perf_counter()
+        results = live.search_index.search(query, locations, limit)
+        search_time = time.perf_counter() - start
+        columns = {name: column.tolist() for name, column in results.items()}
+        rows = [dict(zip(columns, values, strict=True)) for values in zip(*columns.values(), strict=True)]
+        return app.json.response({"query": query, "results": rows, "search_time": search_time})
+
+    @app.route("/locations", methods=["GET"])
+    def location_lookup():
+        """Stores with their number of prices in a bounding box, /locations?bbox=min_lon,min_lat,max_lon,max_lat, within
+        a radius in km of a point, sorted by distance, /locations?near=lat,lon&radius=5, or by id, /locations?ids=1,2"""
+        location_index = live.location_index
+        start = time.perf_counter()
+        try:
+            if "bbox" in request.args:
+                min_lon, min_lat, max_lon, max_lat = map(float, request.args["bbox"].split(","))
+                positions, distances = location_index.bbox(min_lon, min_lat, max_lon, max_lat), None
+            elif "near" in request.args:
+                lat, lon = map(float, request.args["near"].split(","))
+                radius_km = request.args.get("radius", NEAR_RADIUS_KM, type=float)
+                if not 0 < radius_km <= MAX_NEAR_RADIUS_KM:
+                    return f"The radius must be positive and at most {MAX_NEAR_RADIUS_KM} km.", 400
+                positions, distances = location_index.near(lat, lon, radius_km)
+            elif "ids" in request.args:
+                ids = [int(i) for i in request.args["ids"].split(",") if i]
+                if len(ids) > MAX_LOCATION_IDS:
+                    return f"At most {MAX_LOCATION_IDS} ids.", 400
+                positions, distances = location_index.lookup(ids), None
+            else:
+                return "Expected bbox=min_lon,min_lat,max_lon,max_lat, near=lat,lon&radius=km or ids=id,id.", 400
+        except ValueError:
+            return "Invalid coordinates.", 400
+        columns = {name: column.tolist() for name, column in location_index.rows(positions).items()}
+        if distances is not None:
+            columns["distance_km"] = distances.round(3).tolist()
+        rows = [dict(zip(columns, values, strict=True)) for values in zip(*columns.values(), strict=True)]
+        return app.json.response({"locations": rows, "lookup_time": time.perf_counter() - start})
+
+    @functools.lru_cache(maxsize=COMPARISON_CACHE_SIZE)
+    def cached_comparison(state: DataState, locations: tuple[int, ...]) -> list[tuple[str, list[dict | None]]]:
+        """Rows of the comparison table: the category and the lowest price (and its price ID) at each location."""
+        categories, prices, price_ids = state.comparison_matrix.compare(list(locations))
+        return [
+            (category, [None if i < 0 else {"id": int(i), "price": float(p)} for p, i in zip(row, ids, strict=True)])
+            for category, row, ids in zip(categories, prices, price_ids, strict=True)
+        ]
+
+    @app.route("/comparison", methods=["GET"])
+    def comparison():
+        """Price per kg of each comparison category at the locations, e.g. /comparison?locations=601,602,627"""
+        try:
+            locations = tuple(dict.fromkeys(int(loc) for loc in request.args.get("locations", "").split(",") if loc))
+        except ValueError:
+            return "Invalid locations.", 400
+        if not locations:
+            return "No locations selected.", 400
+        state = live
+        names = [state.location_names.get(loc, str(loc)) for loc in locations]
+        return render_template("comparison.html", location_names=names, rows=cached_comparison(state, locations))
+
     @app.route("/info/<price_id>", methods=["GET"])
     def info(price_id: str) -> str:
-        with get_con() as con:
+        state = live
+        with get_con(state.db_path) as con:
             rows = query_dicts(con, """SELECT * FROM final_table_price WHERE price_id = $price_id""", price_id=price_id)
+            # The prices collapsed into the LP column of this product and location (see queries/price_columns.sql)
+            prices = query_dicts(con, PRICE_HISTORY_QUERY, price_id=price_id)
         if len(rows) == 0:
             return "<h1>No product found</h1>"
         row = rows[0]
-        return render_template("info.html", item=row, grouped_nutrients=grouped_nutrients)
+        return render_template("info.html", item=row, grouped_nutrients=state.grouped_nutrients, prices=prices)
 
     return app
 
@@ -0,0 +1,123 @@
+"""Column generation for the LP  min c @ x  s.t.  A_ub @ x <= b_ub, x >= 0  with many products (columns).
+
+A restricted master LP is solved over a small set of columns: the cheapest product of each group (e.g. Ciqual
+subgroup) and the product with the most of each nutrient per unit of cost. Its duals y price all the columns at once,
+d = c - A_ub.T @ y, and the columns with the most negative reduced cost are added until none is negative: the solution
+of the restricted master is then optimal for the full LP.
+
+The seed columns do not always meet the bounds, so a first phase minimizes the relative violation of the bounds
+(with elastic columns, as in dietdashboard/diagnosis.py) the same way. If it ends with violated bounds the full LP is
+infeasible, otherwise the second phase starts from columns that meet the bounds. When the time limit or MAX_ROUNDS is
+reached, the result has status 1: in the second phase with the solution of the last restricted master, which meets
+the bounds but may cost more than the optimum, in the first phase without a solution (the bounds may still be met).
+"""
+
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import OptimizeResult, linprog
+
+MASTER_LP_METHOD = "highs"  # Returns the duals (marginals) needed for the pricing
+COLUMN_GENERATION_MIN_PRODUCTS = 5000  # Default to column generation from this number of products
+COLUMNS_PER_ROUND = 100  # Maximum number of columns added to the restricted master per round
+MAX_ROUNDS = 200
+REDUCED_COST_TOLERANCE = 1e-7
+VIOLATION_TOLERANCE = 1e-7  # Maximum weighted violation of the bounds at the end of the first phase
+
+
+def seed_columns(A: np.ndarray, c: np.ndarray, groups: np.ndarray | None = None) -> np.ndarray:
+    """The cheapest product of each group and the product with the most of each nutrient per unit of cost (A is
+    nutrients x products), products without a group (negative) are not seeds of a group."""
+    per_cost = A / np.maximum(c, np.finfo(np.float64).tiny)
+    seeds = [per_cost.argmax(axis=1)]
+    if groups is not None:
+        order = np.lexsort((c, groups))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = groups[order][1:] != groups[order][:-1]
+        seeds.append(order[first & (groups[order] >= 0)])
+    return np.unique(np.concatenate(seeds))
+
+
+def generate_columns(
+    A_ub: np.ndarray,
+    b_ub: np.ndarray,
+    c: np.ndarray,
+    columns: np.ndarray,
+    weights: np.ndarray | None = None,
+    deadline: float = np.inf,
+) -> tuple[OptimizeResult, np.ndarray, int, int]:
+    """Solve the LP by adding columns to the restricted master until no column has a negative reduced cost.
+
+    With weights, each row also gets an elastic column with that cost (the first phase). After the deadline (of
+    time.perf_counter) or MAX_ROUNDS rounds the last master result is returned with status 1.
+    Returns the last master result, the columns, the number of rounds and the total number of simplex iterations.
+    """
+    num_rows = A_ub.shape[0]
+    rounds = iterations = 0
+    while True:
+        rounds += 1
+        A_master, c_master = A_ub[:, columns], c[columns]
+        if weights is not None:
+            A_master = sp.hstack([sp.csr_array(A_master), -sp.eye_array(num_rows)], format="csr")
+            c_master = np.concatenate([c_master, weights])
+        result = linprog(c_master, A_ub=A_master, b_ub=b_ub, bounds=(0, None), method=MASTER_LP_METHOD)
+        iterations += result.nit
+        if result.status != 0:
+            break
+        reduced = c - A_ub.T @ result.ineqlin.marginals
+        reduced[columns] = np.inf
+        entering = np.flatnonzero(reduced < -REDUCED_COST_TOLERANCE)
+        if len(entering) == 0:
+            break
+        if time.perf_counter() > deadline or rounds >= MAX_ROUNDS:
+            message = "The time limit was reached." if rounds < MAX_ROUNDS else f"The round limit ({MAX_ROUNDS}) was reached."
+            result = OptimizeResult(x=result.x, fun=result.fun, status=1, message=message)
+            break
+        entering = entering[np.argsort(reduced[entering], kind="stable")[:COLUMNS_PER_ROUND]]
+        columns = np.union1d(columns, entering)
+    return result, columns, rounds, iterations
+
+
+def solve_column_generation(
+    A_ub: np.ndarray, b_ub: np.ndarray, c: np.ndarray, groups: np.ndarray | None = None, time_limit: float = np.inf
+) -> OptimizeResult:
+    """Solve the LP with column generation, the rows of A_ub are the lower then upper bounds (-A then A).
+
+    The result has the fields used from linprog results (x and slack over all the products and rows, fun, status,
+    message, nit), and the number of rounds and of columns in the final restricted master.
+    """
+    deadline = time.perf_counter() + time_limit
+    num_rows, num_products = A_ub.shape
+    columns = seed_columns(A_ub[num_rows // 2 :], c, groups)
+
+    # First phase: meet the bounds, minimizing the relative violation (with zero costs for the products)
+    weights = 1 / np.maximum(np.abs(b_ub), 1.0)
+    phase_1, columns, rounds_1, iterations_1 = generate_columns(A_ub, b_ub, np.zeros(num_products), columns, weights, deadline)
+    bounds_met = phase_1.status == 1 and phase_1.fun <= VIOLATION_TOLERANCE  # Stopped by a limit after meeting them
+    if phase_1.status == 1 and not bounds_met:  # Not infeasible, the bounds may be met with more rounds
+        message = f"{phase_1.message} (Column generation ended before meeting the bounds.)"
+        return OptimizeResult(status=1, message=message, nit=iterations_1, rounds=rounds_1, num_columns=len(columns))
+    if phase_1.status not in {0, 1}:
+        return OptimizeResult(status=phase_1.status, message=phase_1.message, nit=iterations_1, rounds=rounds_1)
+    if phase_1.fun > VIOLATION_TOLERANCE:
+        message = "The problem is infeasible. (Column generation ended with violated bounds.)"
+        return OptimizeResult(status=2, message=message, nit=iterations_1, rounds=rounds_1, num_columns=len(columns))
+
+    # Second phase: minimize the cost over columns that can meet the bounds
+    result, columns, rounds_2, iterations_2 = generate_columns(A_ub, b_ub, c, columns, deadline=deadline)
+    x = np.zeros(num_products)
+    if result.status in {0, 1} and result.x is not None:  # With status 1, the last master meets the bounds
+        x[columns] = result.x
+    return OptimizeResult(
+        x=x,
+        fun=result.fun,
+        slack=b_ub - A_ub @ x,
+        status=result.status,
+        message=result.message,
+        success=result.status == 0,
+        nit=iterations_1 + iterations_2,
+        rounds=rounds_1 + rounds_2,
+        num_columns=len(columns),
+        ineqlin=result.get("ineqlin") if result.status == 0 else None,  # The duals of the full LP when converged
+    )
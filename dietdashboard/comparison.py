@@ -0,0 +1,37 @@
+"""Price comparison between locations from the sparse category by location matrix of queries/comparison_prices.sql.
+
+The matrix is loaded once in compressed sparse column form, one column per location, with the position of the entry
+in the price and price ID arrays as its value (so that a price of 0 is still an entry). A comparison of a location set
+gathers its columns and keeps the categories with a price at one of the locations at least.
+"""
+
+import duckdb
+import numpy as np
+import scipy.sparse as sp
+
+
+class ComparisonMatrix:
+    def __init__(self, con: duckdb.DuckDBPyConnection):
+        rows = con.sql("""SELECT location_id, category, price_id, price
+                          FROM comparison_prices ORDER BY location_id, category""").fetchnumpy()
+        self.categories, category_index = np.unique(rows["category"], return_inverse=True)
+        self.location_ids, location_index = np.unique(rows["location_id"].astype(np.int64), return_inverse=True)
+        self.prices = rows["price"].astype(np.float64)
+        self.price_ids = rows["price_id"].astype(np.int64)
+        entries = np.arange(1, len(self.prices) + 1)  # 0 is no entry in the sparse matrix
+        shape = (len(self.categories), len(self.location_ids))
+        self.entries = sp.csc_array((entries, (category_index, location_index)), shape=shape)
+
+    def compare(self, locations: list[int]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Categories with a price at the locations, and their prices and price IDs (categories x locations, in the
+        order of locations), NaN and -1 where a category has no price at a location."""
+        columns = np.searchsorted(self.location_ids, locations)
+        known = np.isin(locations, self.location_ids)
+        entries = np.zeros((len(self.categories), len(locations)), dtype=np.int64)
+        if known.any():
+            entries[:, known] = self.entries[:, columns[known]].toarray()
+        keep = (entries > 0).any(axis=1)
+        entries = entries[keep]
+        prices = np.where(entries > 0, self.prices[entries - 1], np.nan)
+        price_ids = np.where(entries > 0, self.price_ids[entries - 1], -1)
+        return self.categories[keep], prices, price_ids
@@ -0,0 +1,44 @@
+"""Diagnosis of infeasible optimizations with an elastic LP.
+
+Every constraint row of  A_ub @ x <= b_ub  gets a slack  s >= 0  (A_ub @ x - s <= b_ub), and the weighted sum of the
+slacks is minimized. The weights make the slacks relative to the size of the bound, so relaxing a bound by 10 % costs
+the same for every nutrient. The L1 penalty gives a sparse solution: the rows with a positive slack are a small set of
+bounds whose relaxation by the slack makes the problem feasible, found with one extra solve.
+"""
+
+from typing import Any
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import linprog
+
+ELASTIC_LP_METHOD = "highs"
+RELAXATION_THRESHOLD = 1e-6  # Minimum relative slack for a bound to be reported as relaxed
+
+
+def diagnose_infeasibility(A_ub: np.ndarray, b_ub: np.ndarray, nutrient_ids: list[str]) -> list[dict[str, Any]] | None:
+    """Find the bound relaxations that make the problem feasible, the rows of A_ub are the lower then upper bounds.
+
+    Returns one dict per relaxed bound (nutrient_id, bound, value, relaxed_value), or None if the elastic LP fails.
+    """
+    num_rows, num_products = A_ub.shape
+    num_nutrients = len(nutrient_ids)
+    weights = 1 / np.maximum(np.abs(b_ub), 1.0)  # Relative relaxation, with bounds below 1 counting as 1
+    A_elastic = sp.hstack([sp.csr_array(A_ub), -sp.eye_array(num_rows)], format="csr")
+    c = np.concatenate([np.zeros(num_products), weights])
+    result = linprog(c, A_ub=A_elastic, b_ub=b_ub, bounds=(0, None), method=ELASTIC_LP_METHOD)
+    if result.status != 0:
+        return None
+    slack = result.x[num_products:]
+    relaxations = []
+    for i in np.flatnonzero(slack * weights > RELAXATION_THRESHOLD):
+        is_lower = i < num_nutrients
+        value = -b_ub[i] if is_lower else b_ub[i]
+        relaxed_value = value - slack[i] if is_lower else value + slack[i]
+        relaxations.append({
+            "nutrient_id": nutrient_ids[i % num_nutrients],
+            "bound": "lower" if is_lower else "upper",
+            "value": float(value),
+            "relaxed_value": float(relaxed_value),
+        })
+    return relaxations
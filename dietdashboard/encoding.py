@@ -0,0 +1,168 @@
+"""Encoders for the result of an optimization, selected by content negotiation in /optimize.csv.
+
+A result is a set of named tables, each a dict of equally long columns (numpy arrays), together with metadata
+(active constraints, stage timings) that can be serialized as JSON. Three formats are supported:
+- CSV: only the `products` table, the metadata is sent in response headers (what the frontend reads).
+- Arrow IPC streams: one stream per table, concatenated in one body (products first). The schema metadata of each
+  stream has the table name ("table"), the products stream also has the metadata ("meta", JSON).
+- A compact binary layout: every table and the metadata in one body, columns are raw little-endian buffers.
+
+Layout of the binary format:
+    MAGIC (8 bytes) | header length (uint32 little-endian) | header (JSON, utf-8) | padding | buffers
+The header has the metadata and for each table its length and columns with dtype and buffer offsets (relative to the
+start of the buffers, aligned to 8 bytes). String columns have two buffers: int32 offsets (length + 1) and utf-8 data.
+A column with missing values (a numpy masked array, as fetchnumpy returns for NULLs) also has a validity buffer: one
+bit per row, least significant bit first, set when the value is present. Missing floats are NaN, other missing numbers
+0 and missing strings empty, so that a reader ignoring the validity still gets no garbage fill values.
+"""
+
+import csv
+import importlib.util
+import io
+import itertools
+import json
+import struct
+from typing import Any
+
+import numpy as np
+
+CSV_MIMETYPE = "text/csv"
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+BINARY_MIMETYPE = "application/x-dietdashboard-columns"
+MAGIC = b"DIETCOL1"
+ALIGNMENT = 8
+
+Tables = dict[str, dict[str, np.ndarray]]
+
+# The mimetypes that can be encoded, in order of preference when the client accepts any of them
+MIMETYPES = [CSV_MIMETYPE, BINARY_MIMETYPE, *([ARROW_MIMETYPE] if importlib.util.find_spec("pyarrow") else [])]
+
+
+def available_mimetypes() -> list[str]:
+    """The mimetypes that can be encoded, in order of preference when the client accepts any of them."""
+    return MIMETYPES
+
+
+def missing(values: np.ndarray) -> np.ndarray | None:
+    """Mask of the missing values of a column (True where missing), None when none is missing."""
+    if not np.ma.isMaskedArray(values) or not np.ma.getmaskarray(values).any():
+        return None
+    return np.ma.getmaskarray(values)
+
+
+def encode(mimetype: str, tables: Tables, meta: dict[str, Any]) -> bytes | str:
+    """Encode the tables and metadata in the format of the given mimetype."""
+    if mimetype == BINARY_MIMETYPE:
+        return encode_binary(tables, meta)
+    if mimetype == ARROW_MIMETYPE:
+        return encode_arrow(tables, meta)
+    return encode_csv(tables["products"])
+
+
+def encode_csv(columns: dict[str, np.ndarray]) -> str:
+    """Convert a table of columns to a CSV string."""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(columns)
+    rows = []
+    for values in columns.values():
+        if (mask := missing(values)) is not None:  # Missing values are empty fields, not the "--" of masked elements
+            values = np.ma.getdata(values).astype(object)
+            values[mask] = None
+        rows.append(values)
+    writer.writerows(zip(*rows, strict=True))
+    return output.getvalue()
+
+
+def _pad(n: int) -> int:
+    return -n % ALIGNMENT
+
+
+def encode_binary(tables: Tables, meta: dict[str, Any]) -> bytes:
+    """Encode the tables and metadata in the compact binary layout (see module docstring)."""
+    buffers: list[bytes] = []
+    offset = 0
+
+    def add_buffer(data: bytes) -> dict[str, int]:
+        nonlocal offset
+        entry = {"offset": offset, "size": len(data)}
+        buffers.append(data + b"\0" * _pad(len(data)))
+        offset += len(data) + _pad(len(data))
+        return entry
+
+    header: dict[str, Any] = {"meta": meta, "tables": {}}
+    for table_name, columns in tables.items():
+        length = len(next(iter(columns.values()))) if columns else 0
+        column_headers = []
+        for name, values in columns.items():
+            mask = missing(values)
+            values = np.ma.getdata(values)
+            column: dict[str, Any] = {"name": name}
+            if mask is not None:
+                column["validity"] = add_buffer(np.packbits(~mask, bitorder="little").tobytes())
+            if values.dtype.kind in "fiub":
+                if mask is not None:
+                    values = np.where(mask, np.nan if values.dtype.kind == "f" else 0, values).astype(values.dtype)
+                array = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder("<"))
+                column |= {"dtype": array.dtype.str, "data": add_buffer(array.tobytes())}
+            else:  # Strings (and other objects) are encoded as utf-8 with offsets
+                present = ~mask if mask is not None else np.ones(len(values), dtype=bool)
+                encoded = [str(v).encode() if p else b"" for v, p in zip(values, present, strict=True)]
+                offsets = np.zeros(len(encoded) + 1, dtype="<i4")
+                np.cumsum([len(e) for e in encoded], out=offsets[1:])
+                column |= {"dtype": "str", "offsets": add_buffer(offsets.tobytes()), "data": add_buffer(b"".join(encoded))}
+            column_headers.append(column)
+        header["tables"][table_name] = {"length": length, "columns": column_headers}
+
+    header_bytes = json.dumps(header, separators=(",", ":")).encode()
+    prefix = MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes
+    return b"".join([prefix, b"\0" * _pad(len(prefix)), *buffers])
+
+
+def decode_binary(body: bytes) -> tuple[Tables, dict[str, Any]]:
+    """Decode the compact binary layout, numeric columns are views into the body (no copies), the columns with missing
+    values are masked arrays."""
+    if body[: len(MAGIC)] != MAGIC:
+        raise ValueError("Not a dietdashboard binary result.")
+    (header_length,) = struct.unpack_from("<I", body, len(MAGIC))
+    start = len(MAGIC) + 4
+    header = json.loads(body[start : start + header_length])
+    start += header_length + _pad(start + header_length)
+    view = memoryview(body)[start:]
+
+    tables: Tables = {}
+    for table_name, table in header["tables"].items():
+        columns = {}
+        for column in table["columns"]:
+            data = column["data"]
+            if column["dtype"] == "str":
+                offsets = np.frombuffer(view, dtype="<i4", count=table["length"] + 1, offset=column["offsets"]["offset"])
+                raw = bytes(view[data["offset"] : data["offset"] + data["size"]])
+                columns[column["name"]] = np.array([raw[a:b].decode() for a, b in itertools.pairwise(offsets)])
+            else:
+                columns[column["name"]] = np.frombuffer(view, dtype=column["dtype"], count=table["length"], offset=data["offset"])
+            if "validity" in column:
+                bits = np.frombuffer(view, dtype=np.uint8, count=column["validity"]["size"], offset=column["validity"]["offset"])
+                present = np.unpackbits(bits, count=table["length"], bitorder="little").astype(bool)
+                columns[column["name"]] = np.ma.masked_array(columns[column["name"]], mask=~present)
+        tables[table_name] = columns
+    return tables, header["meta"]
+
+
+def encode_arrow(tables: Tables, meta: dict[str, Any]) -> bytes:
+    """Encode every table as its own Arrow IPC stream, the streams are concatenated with the products table first.
+
+    A reader opens one stream after the other on the same input until its end (pyarrow.ipc.open_stream on a
+    pyarrow.BufferReader stops after the end of stream marker of each).
+    """
+    import pyarrow as pa
+
+    sink = pa.BufferOutputStream()
+    for name in sorted(tables, key=lambda name: name != "products"):
+        # pa.array turns the mask of a masked array into nulls
+        table = pa.table({column: pa.array(values) for column, values in tables[name].items()})
+        metadata = {"table": name} | ({"meta": json.dumps(meta)} if name == "products" else {})
+        table = table.replace_schema_metadata(metadata)
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    return sink.getvalue().to_pybytes()
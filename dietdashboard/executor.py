@@ -0,0 +1,124 @@
+"""Bounded process pool for the CPU-bound solves, so that the request threads only wait on them.
+
+The app runs with threaded workers (gunicorn --threads, see the Makefile and the Containerfile): a request thread
+submits its solve to the pool and waits on the result with the GIL released, so cheap requests (/validate_objective,
+/info, static files) are served by the other threads meanwhile, whatever the solves in progress. At most SOLVER_WORKERS
+solves run at once and at most SOLVER_QUEUE_SIZE more wait for a worker. A solve beyond that waits up to
+SOLVER_QUEUE_TIMEOUT for a place and then fails with SolverBusy (back-pressure) instead of piling up. The mean duration
+of the recent solves (an exponential moving average) estimates when a place frees up, for the Retry-After of the
+rejected requests.
+
+The pool is started on the first solve, after gunicorn has forked its workers, and its processes are spawned (not
+forked from a process with threads). The arguments and results are pickled, which costs little next to a solve.
+With SOLVER_WORKERS = 0 the solves run in the request thread, with the same bounds. The CPUs are shared between the
+APP_PROCESSES gunicorn workers (WEB_CONCURRENCY, which gunicorn also reads as its number of workers), each with its pool,
+SOLVER_WORKERS can also be set in the environment.
+"""
+
+import math
+import multiprocessing
+import os
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any
+
+APP_PROCESSES = int(os.environ.get("WEB_CONCURRENCY", 2))  # gunicorn workers, the Makefile and the Containerfile run two
+SOLVER_WORKERS = int(os.environ.get("SOLVER_WORKERS", max((os.cpu_count() or 1) // APP_PROCESSES, 1)))  # Per app process
+SOLVER_QUEUE_SIZE = 2 * SOLVER_WORKERS  # Solves waiting for a worker
+SOLVER_QUEUE_TIMEOUT = 1.0  # Seconds to wait for a place in the queue
+DURATION_SMOOTHING = 0.2  # Weight of the last solve in the mean solve duration
+
+
+class SolverBusy(Exception):
+    """Raised when the queue of solves stays full for the queue timeout, retry_after is in seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SolverPool:
+    def __init__(
+        self, workers: int = SOLVER_WORKERS, queue_size: int = SOLVER_QUEUE_SIZE, queue_timeout: float = SOLVER_QUEUE_TIMEOUT
+    ):
+        self.workers = workers
+        self.capacity = max(workers, 1) + queue_size
+        self.queue_timeout = queue_timeout
+        self.slots = threading.BoundedSemaphore(self.capacity)
+        self.lock = threading.Lock()
+        self.executor: ProcessPoolExecutor | None = None
+        self.pending = self.completed = self.rejected = 0
+        self.mean_duration = 0.0
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self.executor
+
+    @property
+    def depth(self) -> int:
+        """Number of solves running or waiting for a worker."""
+        return self.pending
+
+    @property
+    def busy(self) -> bool:
+        """All the workers are solving, a new solve would wait in the queue."""
+        return self.pending >= max(self.workers, 1)
+
+    @property
+    def full(self) -> bool:
+        """The queue is full, a new solve would wait for a place (and be rejected after the queue timeout)."""
+        return self.pending >= self.capacity
+
+    def retry_after(self) -> int:
+        """Seconds until the solves ahead of a new one are likely done, at least 1."""
+        return max(math.ceil(self.mean_duration * (self.pending + 1) / max(self.workers, 1)), 1)
+
+    def status(self) -> dict[str, int | float]:
+        running = min(self.pending, max(self.workers, 1))
+        return {
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "running": running,
+            "queued": self.pending - running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "mean_duration": round(self.mean_duration, 4),
+        }
+
+    def reject(self) -> SolverBusy:
+        """Count a solve turned away and the error to raise for it."""
+        with self.lock:
+            self.rejected += 1
+        return SolverBusy(f"Too many optimizations in progress ({self.capacity}), try again later.", self.retry_after())
+
+    def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run fn (a module-level function) in the pool and wait for its result, raises SolverBusy when the queue is full."""
+        if not self.slots.acquire(timeout=self.queue_timeout):
+            raise self.reject()
+        with self.lock:
+            self.pending += 1
+        start = time.perf_counter()
+        try:
+            if self.workers == 0:
+                return fn(*args, **kwargs)
+            executor = self.get_executor()
+            try:
+                return executor.submit(fn, *args, **kwargs).result()
+            except BrokenProcessPool:  # A worker died (e.g. out of memory), start a new pool for the next solves
+                with self.lock:
+                    if self.executor is executor:
+                        self.executor = None
+                executor.shutdown(wait=False)
+                raise
+        finally:
+            with self.lock:
+                self.pending -= 1
+                self.completed += 1
+                duration = time.perf_counter() - start
+                self.mean_duration += DURATION_SMOOTHING * (duration - self.mean_duration) if self.completed > 1 else duration
+            self.slots.release()
@@ -0,0 +1,58 @@
+"""Product filters (diet, Ciqual group and subgroup, NOVA group, allergens) from the bitmaps of queries/filters.sql.
+
+The bitmaps are built at data-build time, one per filter value, over the rows of final_table_price in price_id order.
+They are kept packed (8 rows per byte) and combined with bitwise operations: values of the same filter with OR,
+different filters with AND, and excluded values with AND NOT. The candidates of a request are then looked up by the
+position of their price_id in the row order.
+
+The BLOB of a DuckDB bitstring is padded at the start: the first (-length % 8) bits are not rows.
+"""
+
+from typing import Any
+
+import duckdb
+import numpy as np
+
+FILTERS = ("diet", "ciqual_group", "ciqual_subgroup", "nova", "allergen")
+
+
+class FilterBitmaps:
+    def __init__(self, con: duckdb.DuckDBPyConnection):
+        self.price_ids = con.sql("SELECT price_id FROM filter_rows ORDER BY row_index").fetchnumpy()["price_id"]
+        self.padding = -len(self.price_ids) % 8
+        self.bitmaps: dict[tuple[str, str], np.ndarray] = {
+            (f, value): np.frombuffer(bitmap, dtype=np.uint8)
+            for f, value, bitmap in con.sql("SELECT filter, value, bitmap FROM filter_bitmaps").fetchall()
+        }
+        self.values = {f: sorted(value for g, value in self.bitmaps if g == f) for f in FILTERS}
+        self.empty = np.zeros((len(self.price_ids) + self.padding) // 8, dtype=np.uint8)
+        # bitstring_agg takes its length from the statistics of row_index, the positions are only right if it is the
+        # number of rows
+        for (f, value), bitmap in self.bitmaps.items():
+            if len(bitmap) != len(self.empty):
+                raise ValueError(
+                    f"The bitmap of {f} {value} has {len(bitmap)} bytes, expected {len(self.empty)} for "
+                    f"{len(self.price_ids)} rows, rebuild the filter tables (queries/filters.sql)."
+                )
+
+    def union(self, f: str, values: list[Any]) -> np.ndarray:
+        """Rows with any of the values of the filter (a value without rows matches nothing)."""
+        if f not in FILTERS:
+            raise ValueError(f"Unknown filter {f}, available filters: {', '.join(FILTERS)}")
+        return np.bitwise_or.reduce([self.empty, *(self.bitmaps.get((f, str(v)), self.empty) for v in values)])
+
+    def combine(self, include: dict[str, list[Any]], exclude: dict[str, list[Any]]) -> np.ndarray:
+        """Packed mask of the rows that match all the included filters and none of the excluded values."""
+        mask = np.full_like(self.empty, 0xFF)
+        for f, values in include.items():
+            mask &= self.union(f, values)
+        for f, values in exclude.items():
+            mask &= ~self.union(f, values)
+        return mask
+
+    def select(self, mask: np.ndarray, price_ids: np.ndarray) -> np.ndarray:
+        """Boolean array of which of the price_ids are set in the packed mask (unknown price ids are not)."""
+        positions = np.minimum(np.searchsorted(self.price_ids, price_ids), len(self.price_ids) - 1)
+        known = self.price_ids[positions] == price_ids
+        bits = positions + self.padding
+        return known & ((mask[bits >> 3] >> (7 - (bits & 7))) & 1).astype(bool)
@@ -29,7 +29,7 @@ const template = `<p style="margin: 0 0 0.5rem; font-size: 0.85rem">A map-based
  * @param {Array<LocationInfo>} data
  * @param {State} state
  */
-function LocationTable(parent, data, state) {
+export function LocationTable(parent, data, state) {
   const rows = data.filter(location => location.id in state.locations).map(location => [location.name, location.count]);
   Table(parent, rows);
 }
@@ -10,13 +10,17 @@
 // https://observablehq.com/@d3/seamless-zoomable-map-tiles?collection=@d3/d3-tile
 import * as d3 from "../d3";
 import { persistState } from "../index";
-import { locationStateChange } from "./locations";
-import { Markers } from "./markers";
+import { LocationTable, locationStateChange } from "./locations";
+import { Markers, projection } from "./markers";
 
 const url = (x, y, z) => `https://tile.openstreetmap.org/${z}/${x}/${y}.png`;
 const width = 960,
   height = 500,
   deltas = [-100, -4, -1, 0];
+const minLoadScale = 1 << 11; // Below this zoom the view covers too many locations, they are not loaded
+let loadedBbox = null; // The bounding box of the last request, the map is redrawn on every state change
+const requestedIds = new Set(); // Selected locations already requested by id (restored or selected out of view)
+const maxIdsPerRequest = 1000; // MAX_LOCATION_IDS of the app
 
 /**
  * @param {d3.Selection} parent
@@ -71,7 +75,8 @@ export function Map(parent, data, state) {
     .zoom()
     .scaleExtent([1 << 8, 1 << 22])
     .extent(extent)
-    .on("zoom", event => zoomed(event.transform));
+    .on("zoom", event => zoomed(event.transform))
+    .on("end", event => loadLocations(event.transform));
 
   const levels = parent.selectAll("g.levels").data(deltas).join("g").attr("class", "levels").attr("pointer-events", "none");
 
@@ -85,6 +90,7 @@ export function Map(parent, data, state) {
   parent.on(".zoom", state.brushMode ? null : zoom); // Disable zooming when brush mode is active
 
   Brush(parent, data, state, extent);
+  loadSelected();
 
   function zoomed(transform) {
     // Update all tile levels based on the current transform
@@ -101,12 +107,56 @@ export function Map(parent, data, state) {
         .attr("height", tiles.scale);
     });
 
-    // Update marker positions
+    placeMarkers(transform);
+    state.mapTransform = { k: transform.k, x: transform.x, y: transform.y };
+    persistState();
+  }
+
+  function placeMarkers(transform) {
     markerGroup
       .selectAll("circle")
       .attr("cx", d => transform.applyX(d.x))
       .attr("cy", d => transform.applyY(d.y));
-    state.mapTransform = { k: transform.k, x: transform.x, y: transform.y };
-    persistState();
+  }
+
+  /**
+   * Add the locations to data (the ones already loaded are kept), and redraw the markers and the table.
+   * @param {Array<LocationInfo>} locations
+   */
+  function addLocations(locations) {
+    const known = new Set(data.map(d => d.id));
+    locations.forEach(location => known.has(location.id) || data.push(location));
+    Markers(markerGroup, data, state);
+    placeMarkers(d3.zoomTransform(parent.node()));
+    LocationTable(d3.select("#location-table-body"), data, state);
+  }
+
+  /** Load the selected locations that are not loaded yet, wherever they are. */
+  function loadSelected() {
+    const known = new Set(data.map(d => String(d.id)));
+    const ids = Object.keys(state.locations).filter(id => !known.has(id) && !requestedIds.has(id));
+    if (ids.length === 0) return;
+    ids.forEach(id => requestedIds.add(id));
+    for (let i = 0; i < ids.length; i += maxIdsPerRequest) {
+      fetch(`/locations?ids=${ids.slice(i, i + maxIdsPerRequest).join(",")}`)
+        .then(response => response.json())
+        .then(({ locations }) => addLocations(locations));
+    }
+  }
+
+  /**
+   * Add the locations in view to data, the locations already loaded (and selected) are kept.
+   * @param {d3.ZoomTransform} transform
+   */
+  function loadLocations(transform) {
+    if (transform.k < minLoadScale) return;
+    const [west, north] = projection.invert(transform.invert([0, 0]));
+    const [east, south] = projection.invert(transform.invert([width, height]));
+    const bbox = [west, south, east, north].map(v => v.toFixed(4)).join(",");
+    if (bbox === loadedBbox) return;
+    loadedBbox = bbox;
+    fetch(`/locations?bbox=${bbox}`)
+      .then(response => response.json())
+      .then(({ locations }) => addLocations(locations));
   }
 }
@@ -1,17 +1,18 @@
 import * as d3 from "../d3";
 import { locationStateChange } from "./locations";
 
+// Web Mercator projection of the map tiles at scale 1, the zoom transform scales it to the view
+export const projection = d3
+  .geoMercator()
+  .scale(1 / (2 * Math.PI))
+  .translate([0, 0]);
+
 /**
  * @param {d3.Selection} parent
  * @param {Array<LocationInfo>} data
  * @param {State} state
  */
 export function Markers(parent, data, state) {
-  const projection = d3
-    .geoMercator()
-    .scale(1 / (2 * Math.PI))
-    .translate([0, 0]);
-
   data.forEach(d => ([d.x, d.y] = projection([d.lon, d.lat])));
 
   parent
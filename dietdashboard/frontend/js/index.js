@@ -4,7 +4,7 @@ import { Result } from "./components/result";
 import { Objective } from "./components/objective";
 import { Sliders, SlidersTableBody } from "./components/sliders";
 import { Tabs } from "./components/tabs";
-import { autoType, csv, csvParse, select } from "./d3";
+import { autoType, csvParse, select } from "./d3";
 import { defaultLocations } from "./defaultLocations";
 
 export function handleStateChange() {
@@ -61,7 +61,7 @@ var state = {
 };
 state = { ...state, ...restoreState() };
 
-const locationData = await csv("/static/locations.csv", autoType);
+const locationData = []; // Filled by the map with the selected locations and the ones in view (/locations)
 
 const tabs = [
   { id: "sliders-tab", name: "Nutrient Targets", component: parent => Sliders(parent, state) },
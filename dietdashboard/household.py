@@ -0,0 +1,79 @@
+"""Optimization of one shared shopping basket for a household of several people.
+
+The LP has shared purchase columns x (the basket, one per product) that carry the cost, and one block of allocation
+columns y_m per person that carries the nutrient rows of their own bounds. Coupling rows make the purchases cover the
+allocations: x_p >= sum_m y_{m,p}. The allocation blocks are block diagonal and only linked through the purchases, the
+constraint matrix is built as a sparse matrix and solved in a single HiGHS call. People with the same bounds (e.g. two
+adults of the same sex) get the same allocation, so only one block per distinct set of bounds is solved and its
+allocation is counted once per person in the coupling rows.
+"""
+
+from typing import Any
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import OptimizeResult, linprog
+
+HOUSEHOLD_LP_METHOD = "highs"  # Sparse block-diagonal constraints, the revised simplex only takes dense matrices
+SEXES = ("male", "female")  # Maps to the value_males and value_females columns of the recommendations table
+MAX_MEMBERS = 12
+
+
+def member_bounds(
+    recommendations: dict[str, dict[str, Any]], nutrient_ids: list[str], members: list[dict[str, Any]]
+) -> tuple[np.ndarray, np.ndarray]:
+    """Lower and upper bounds (one row per member) from the recommendations of their sex, unless given in the member.
+
+    A member is a dict with a "sex" ("male" or "female") and optionally "{nutrient_id}_lower" or "{nutrient_id}_upper".
+    """
+    lb = np.zeros((len(members), len(nutrient_ids)), dtype=np.float64)
+    ub = np.full((len(members), len(nutrient_ids)), np.inf, dtype=np.float64)
+    for i, member in enumerate(members):
+        if member.get("sex") not in SEXES:
+            raise ValueError(f"Member {i} has sex {member.get('sex')!r}, expected one of {', '.join(SEXES)}.")
+        for j, nid in enumerate(nutrient_ids):
+            rec = recommendations[nid]
+            lower = member.get(f"{nid}_lower", rec[f"value_{member['sex']}s"])
+            upper = member.get(f"{nid}_upper", rec["value_upper_intake"])
+            lb[i, j] = float(lower) if lower is not None else 0
+            ub[i, j] = float(upper) if upper is not None else np.inf
+    return lb, ub
+
+
+def solve_household(
+    A: np.ndarray, lb: np.ndarray, ub: np.ndarray, c: np.ndarray, time_limit: float | None = None
+) -> tuple[OptimizeResult, np.ndarray, np.ndarray]:
+    """Minimize the cost of the purchased basket such that each member's allocation meets their bounds.
+
+    A has one row per nutrient and one column per product, lb and ub have one row per member. A solve stopped by the
+    time limit (seconds) fails with status 1.
+    Returns the result of the solve, the basket (products) and the allocations (members x products).
+    """
+    num_nutrients, num_products = A.shape
+    # One block per distinct set of bounds, weighted by the number of members that share it
+    blocks, member_block, counts = np.unique(np.hstack([lb, ub]), axis=0, return_inverse=True, return_counts=True)
+    block_lb, block_ub = blocks[:, :num_nutrients], blocks[:, num_nutrients:]
+
+    # Nutrient rows on the allocations y (the purchase columns x come first and have no nutrient rows)
+    A_sparse = sp.csr_array(A)
+    rows, b_ub = [], []
+    for k in range(len(blocks)):
+        finite = np.isfinite(block_ub[k])  # Only finite upper bounds are constraints
+        rows.append(sp.vstack([-A_sparse, A_sparse[finite]]))
+        b_ub.append(np.concatenate([-block_lb[k], block_ub[k][finite]]))
+    allocation_rows = sp.block_diag(rows, format="csr")
+    nutrient_rows = sp.hstack([sp.csr_array((sum(len(b) for b in b_ub), num_products)), allocation_rows])
+    # Coupling rows: sum_k count_k y_{k,p} - x_p <= 0
+    identity = sp.eye_array(num_products, format="csr")
+    coupling_rows = sp.hstack([-identity, *(count * identity for count in counts)])
+    A_ub = sp.vstack([nutrient_rows, coupling_rows], format="csr")
+    b_ub.append(np.zeros(num_products))
+    costs = np.concatenate([c, np.zeros(len(blocks) * num_products)])
+
+    options = {"time_limit": time_limit} if time_limit is not None else {}
+    result = linprog(costs, A_ub=A_ub, b_ub=np.concatenate(b_ub), bounds=(0, None), method=HOUSEHOLD_LP_METHOD, options=options)
+    if result.status != 0:
+        return result, np.zeros(num_products), np.zeros((len(lb), num_products))
+    basket = result.x[:num_products]
+    allocations = result.x[num_products:].reshape(len(blocks), num_products)[member_block.ravel()]
+    return result, basket, allocations
@@ -0,0 +1,96 @@
+"""Spatial index of the locations (stores) for the bounding box and nearby lookups of the map and the optimization.
+
+The locations are bucketed in a uniform grid of GRID_CELL_DEGREES cells over (lat, lon), sorted by cell, so the
+locations of a cell are one contiguous slice found in a dict. A bounding box reads the cells it overlaps and filters
+their locations exactly, a box that covers more cells than there are locations is scanned instead. A radius query is
+the bounding box of the circle followed by the haversine distance, and returns the locations sorted by distance.
+"""
+
+from itertools import starmap
+
+import duckdb
+import numpy as np
+
+GRID_CELL_DEGREES = 0.05  # About 5.5 km of latitude, the radius of a typical "nearby" query
+EARTH_RADIUS_KM = 6371.0088
+NEAR_RADIUS_KM = 5.0
+MAX_NEAR_RADIUS_KM = 100.0
+
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distance in km from (lat, lon) to each of the points, in degrees."""
+    lat, lon, lats, lons = np.radians(lat), np.radians(lon), np.radians(lats), np.radians(lons)
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class LocationIndex:
+    def __init__(self, con: duckdb.DuckDBPyConnection):
+        rows = con.sql("""SELECT
+                            location_id,
+                            any_value(location_osm_id) AS osm_id,
+                            any_value(location_osm_display_name) AS name,
+                            any_value(location_osm_lat)::DOUBLE AS lat,
+                            any_value(location_osm_lon)::DOUBLE AS lon,
+                            count(*) AS count
+                          FROM final_table_price
+                          WHERE location_osm_lat IS NOT NULL AND location_osm_lon IS NOT NULL
+                          GROUP BY location_id""").fetchnumpy()
+        cell_lat, cell_lon = self.cell(rows["lat"]), self.cell(rows["lon"])
+        order = np.lexsort((rows["location_id"], cell_lon, cell_lat))
+        self.ids = rows["location_id"][order].astype(np.int64)
+        self.osm_ids = rows["osm_id"][order]
+        self.names = rows["name"][order]
+        self.lats, self.lons = rows["lat"][order], rows["lon"][order]
+        self.counts = rows["count"][order].astype(np.int64)
+
+        # Slice of the sorted locations of each non-empty cell
+        cell_lat, cell_lon = cell_lat[order], cell_lon[order]
+        new = np.ones(len(order), dtype=bool)
+        new[1:] = (cell_lat[1:] != cell_lat[:-1]) | (cell_lon[1:] != cell_lon[:-1])
+        starts = np.flatnonzero(new)
+        ends = np.append(starts[1:], len(order))
+        self.cells = {(int(cell_lat[s]), int(cell_lon[s])): (int(s), int(e)) for s, e in zip(starts, ends, strict=True)}
+
+    @staticmethod
+    def cell(degrees: np.ndarray | float) -> np.ndarray:
+        return np.floor(np.asarray(degrees) / GRID_CELL_DEGREES).astype(np.int64)
+
+    def bbox(self, min_lon: float, min_lat: float, max_lon: float, max_lat: float) -> np.ndarray:
+        """Positions of the locations within the bounding box."""
+        lat_cells = range(int(self.cell(min_lat)), int(self.cell(max_lat)) + 1)
+        lon_cells = range(int(self.cell(min_lon)), int(self.cell(max_lon)) + 1)
+        if len(lat_cells) * len(lon_cells) > len(self.ids):  # Larger than the data, scan every location
+            candidates = np.arange(len(self.ids))
+        else:
+            slices = [self.cells[i, j] for i in lat_cells for j in lon_cells if (i, j) in self.cells]
+            candidates = np.concatenate(list(starmap(np.arange, slices)) or [np.array([], dtype=np.intp)])
+        lats, lons = self.lats[candidates], self.lons[candidates]
+        inside = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+        return candidates[inside]
+
+    def lookup(self, ids: list[int]) -> np.ndarray:
+        """Positions of the locations with the given ids (unknown ids are skipped)."""
+        return np.flatnonzero(np.isin(self.ids, ids))
+
+    def near(self, lat: float, lon: float, radius_km: float) -> tuple[np.ndarray, np.ndarray]:
+        """Positions of the locations within the radius and their distance in km, sorted by distance."""
+        dlat = np.degrees(radius_km / EARTH_RADIUS_KM)
+        dlon = dlat / max(np.cos(np.radians(lat)), 1e-6)
+        candidates = self.bbox(lon - dlon, lat - dlat, lon + dlon, lat + dlat)
+        distances = haversine_km(lat, lon, self.lats[candidates], self.lons[candidates])
+        within = distances <= radius_km
+        candidates, distances = candidates[within], distances[within]
+        order = np.argsort(distances, kind="stable")
+        return candidates[order], distances[order]
+
+    def rows(self, positions: np.ndarray) -> dict[str, np.ndarray]:
+        """The columns of the locations at the positions (id, osm_id, name, lat, lon and count, as read by the map)."""
+        return {
+            "id": self.ids[positions],
+            "osm_id": self.osm_ids[positions],
+            "name": self.names[positions],
+            "lat": self.lats[positions],
+            "lon": self.lons[positions],
+            "count": self.counts[positions],
+        }
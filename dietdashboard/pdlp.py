@@ -0,0 +1,175 @@
+"""Restarted primal-dual hybrid gradient (PDHG) for the LP  min c @ x  s.t.  A_ub @ x <= b_ub, x >= 0, as in PDLP.
+
+Only matrix-vector products with the sparse A_ub and its transpose are needed, no factorization, so the cost of an
+iteration grows linearly with the number of products. With the multipliers lam >= 0 of the rows, one iteration is
+    x   <- max(0, x - tau * (c + A_ub.T @ lam))
+    lam <- max(0, lam + sigma * (A_ub @ (2 x_new - x) - b_ub))
+with tau = step / w and sigma = step * w, where w is the primal weight. The step is adapted at every iteration to the
+largest one that the last move allows (step <= movement / interaction, as in PDLP), with a retry when it was too large.
+The problem is first equilibrated (dietdashboard/scaling.py). Every RESTART_CHECK iterations the relative KKT error
+(primal and dual residuals and duality gap) of the current iterate and of the average since the last restart is
+computed, the best is the candidate. The solve stops when the candidate is within the tolerance, and restarts from it
+when its error has decreased enough since the last restart, updating the primal weight with the distances travelled.
+
+The answer within the iteration and time budget is approximate (status 1 when the tolerance is not reached). The
+crossover polish solves the LP again over the products in the approximate basket (and those with a near-zero reduced
+cost) with HiGHS. Its vertex solution is optimal (status 0) when the duals of this smaller LP leave no product of the
+full LP with a negative reduced cost. The polish is optional, and always runs when the budget ends with a KKT error
+above PDLP_ACCEPTED_ERROR, far answers (e.g. 0.05) are tens of percent off the optimum and break bounds by percents.
+Infeasible problems are not detected, they end at the budget with the last candidate, which violates the bounds.
+"""
+
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import OptimizeResult, linprog
+
+from dietdashboard.scaling import scale_problem
+
+PDLP_TOLERANCE = 1e-4  # Relative KKT error
+PDLP_MAX_ITERATIONS = 20_000
+PDLP_TIME_LIMIT = 2.0  # Seconds
+PDLP_CROSSOVER = False
+PDLP_ACCEPTED_ERROR = 1e-4  # Largest relative KKT error of an answer returned without the crossover polish
+RESTART_CHECK = 64
+RESTART_SUFFICIENT = 0.2  # Restart when the KKT error decreased by this factor since the last restart
+RESTART_NECESSARY = 0.8  # Or by this factor and is no longer decreasing
+RESTART_ARTIFICIAL = 0.36  # Or when the iterations since the last restart are this fraction of all the iterations
+CROSSOVER_LP_METHOD = "highs"
+CROSSOVER_THRESHOLD = 1e-6  # Relative quantity (and reduced cost) for a product to be kept by the crossover
+
+
+def kkt_error(c: np.ndarray, b: np.ndarray, x: np.ndarray, lam: np.ndarray, Ax: np.ndarray, ATlam: np.ndarray) -> float:
+    """Largest relative error of the primal residual (relative per row), the dual residual and the duality gap."""
+    primal = np.linalg.norm(np.maximum(Ax - b, 0) / (1 + np.abs(b)))  # Per row, loose bounds (e.g. 1e9) do not hide others
+    dual = np.linalg.norm(np.minimum(c + ATlam, 0)) / (1 + np.linalg.norm(c))
+    primal_objective, dual_objective = c @ x, -b @ lam
+    gap = abs(primal_objective - dual_objective) / (1 + abs(primal_objective) + abs(dual_objective))
+    return float(max(primal, dual, gap))
+
+
+def polish(
+    A_ub: np.ndarray, b_ub: np.ndarray, c: np.ndarray, x: np.ndarray, reduced: np.ndarray
+) -> tuple[np.ndarray, np.ndarray] | None:
+    """Solve the LP over the products in the basket or with a near-zero reduced cost, the solution and the multipliers
+    of the rows (lam >= 0), None if it fails."""
+    keep = (x > CROSSOVER_THRESHOLD * max(x.max(initial=0), 1)) | (reduced <= CROSSOVER_THRESHOLD * max(np.abs(c).max(), 1))
+    columns = np.flatnonzero(keep)
+    if len(columns) == 0:
+        return None
+    result = linprog(c[columns], A_ub=A_ub[:, columns], b_ub=b_ub, bounds=(0, None), method=CROSSOVER_LP_METHOD)
+    if result.status != 0:
+        return None
+    x_polished = np.zeros(len(c))
+    x_polished[columns] = result.x
+    return x_polished, -result.ineqlin.marginals
+
+
+def solve_pdlp(
+    A_ub: np.ndarray,
+    b_ub: np.ndarray,
+    c: np.ndarray,
+    tolerance: float = PDLP_TOLERANCE,
+    max_iterations: int = PDLP_MAX_ITERATIONS,
+    time_limit: float = PDLP_TIME_LIMIT,
+    crossover: bool = PDLP_CROSSOVER,
+    accepted_error: float = PDLP_ACCEPTED_ERROR,
+) -> OptimizeResult:
+    """Solve the LP with restarted PDHG, the result has the fields used from linprog results (x, fun, slack, status,
+    message, nit and the ineqlin marginals) and the relative KKT error of the returned solution (of the scaled LP, 0
+    after an optimal crossover). The crossover runs when asked or when the error is above accepted_error."""
+    start = time.perf_counter()
+    A_scaled, b, c_scaled, row_scale, col_scale = scale_problem(A_ub, b_ub, c)
+    A, AT = sp.csr_array(A_scaled), sp.csr_array(A_scaled.T)
+    step = 1 / max(np.abs(A_scaled).max(), np.finfo(np.float64).tiny)
+    b_norm, c_norm = np.linalg.norm(b), np.linalg.norm(c_scaled)
+    weight = c_norm / b_norm if b_norm > 0 and c_norm > 0 else 1.0
+
+    num_rows, num_products = A_scaled.shape
+    x, lam = np.zeros(num_products), np.zeros(num_rows)
+    Ax, ATlam = np.zeros(num_rows), np.zeros(num_products)
+    x_sum, lam_sum = np.zeros(num_products), np.zeros(num_rows)
+    x_restart, lam_restart = x, lam
+    restart_error = kkt_error(c_scaled, b, x, lam, Ax, ATlam)
+    previous_error = np.inf
+    since_restart = iterations = attempts = 0
+    status, message = 1, "The iteration limit was reached."
+    while iterations < max_iterations:
+        iterations += 1
+        since_restart += 1
+        while True:  # Adaptive step size, retried with a smaller step when it is too large for the last move
+            attempts += 1
+            x_new = np.maximum(x - step / weight * (c_scaled + ATlam), 0)
+            Ax_new = A @ x_new
+            lam_new = np.maximum(lam + step * weight * (2 * Ax_new - Ax - b), 0)
+            ATlam_new = AT @ lam_new
+            dx, dlam = x_new - x, lam_new - lam
+            interaction = abs(dx @ (ATlam_new - ATlam))
+            movement = 0.5 * weight * (dx @ dx) + 0.5 / weight * (dlam @ dlam)
+            limit = movement / interaction if interaction > 0 else np.inf
+            accepted = step <= limit
+            step = min((1 - (attempts + 1) ** -0.3) * limit, (1 + (attempts + 1) ** -0.6) * step)
+            if accepted:
+                break
+        x, lam, Ax, ATlam = x_new, lam_new, Ax_new, ATlam_new
+        x_sum += x
+        lam_sum += lam
+        if iterations % RESTART_CHECK != 0:
+            continue
+
+        # The candidate is the best of the current iterate and the average since the last restart
+        candidate = (x, lam, Ax, ATlam)
+        error = kkt_error(c_scaled, b, *candidate)
+        x_avg, lam_avg = x_sum / since_restart, lam_sum / since_restart
+        average = (x_avg, lam_avg, A @ x_avg, AT @ lam_avg)
+        if (avg_error := kkt_error(c_scaled, b, *average)) < error:
+            candidate, error = average, avg_error
+        if error <= tolerance:
+            x, lam, Ax, ATlam = candidate
+            status, message = 0, "Optimization terminated successfully. (PDHG within the tolerance.)"
+            break
+        if time.perf_counter() - start > time_limit:
+            x, lam, Ax, ATlam = candidate
+            message = "The time limit was reached."
+            break
+        if (
+            error <= RESTART_SUFFICIENT * restart_error
+            or (error <= RESTART_NECESSARY * restart_error and error > previous_error)
+            or since_restart >= RESTART_ARTIFICIAL * iterations
+        ):
+            x, lam, Ax, ATlam = candidate
+            dx, dlam = np.linalg.norm(x - x_restart), np.linalg.norm(lam - lam_restart)
+            if dx > 0 and dlam > 0:  # Balance the primal and dual distances
+                weight = np.exp(0.5 * np.log(dlam / dx) + 0.5 * np.log(weight))
+            x_restart, lam_restart, restart_error = x, lam, error
+            x_sum, lam_sum = np.zeros(num_products), np.zeros(num_rows)
+            since_restart = 0
+            error = np.inf
+        previous_error = error
+    kkt = kkt_error(c_scaled, b, x, lam, Ax, ATlam)
+
+    x, lam = x * col_scale, lam * row_scale
+    if crossover or kkt > accepted_error:
+        polished = polish(A_ub, b_ub, c, x, c + A_ub.T @ lam)
+        if polished is not None:
+            x, lam = polished
+            reduced = c + A_ub.T @ lam
+            if reduced.min(initial=0) >= -CROSSOVER_THRESHOLD * max(np.abs(c).max(), 1):  # Optimal for all the products
+                kkt, status, message = 0.0, 0, "Optimization terminated successfully. (PDHG with crossover.)"
+            else:
+                x_scaled, lam_scaled = x / col_scale, lam / row_scale
+                kkt = kkt_error(c_scaled, b, x_scaled, lam_scaled, A_scaled @ x_scaled, A_scaled.T @ lam_scaled)
+                message = f"{message} (The crossover over the basket is not optimal for all the products.)"
+    slack = b_ub - A_ub @ x
+    return OptimizeResult(
+        x=x,
+        fun=float(c @ x),
+        slack=slack,
+        ineqlin=OptimizeResult(marginals=-lam, residual=slack),
+        status=status,
+        message=message,
+        success=status == 0,
+        nit=iterations,
+        kkt_error=float(kkt),
+    )
@@ -0,0 +1,34 @@
+"""Opt-in profiling of the solve requests with cProfile, on a sample of them or when a request from an admin address has
+the PROFILE_HEADER. The sample rate is read from the PROFILE_SAMPLE_RATE environment variable (0 by default).
+
+Only the solves are profiled, each in its solver worker process (dietdashboard/executor.py) by run_profiled: the request
+threads share their process (gunicorn --threads) and cProfile can not profile one thread alone there (a single profiler
+per process on Python 3.12+), while a worker process runs one solve at a time. The profiles are pstats files (.out)
+stored in the debug folder of the request, next to its input.json and times.json (in tmp/profile/ for the requests
+without one), so that they render as the benchmark profiles do:
+    bash benchmark/serve.sh tmp/optimize/<request folder>
+"""
+
+import cProfile
+import os
+import random
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0.0))  # Fraction of the solve requests profiled
+PROFILE_HEADER = "X-Profile"  # Profiles the request whatever the sample rate (from the admin addresses only)
+
+
+def profile_request(requested: bool = False, sample_rate: float = PROFILE_SAMPLE_RATE) -> bool:
+    """Whether the solves of the request are profiled: it is sampled or asks for it."""
+    return requested or random.random() < sample_rate
+
+
+def run_profiled(path: Path, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run fn under cProfile (in a solver worker process) and store its profile at path."""
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(fn, *args, **kwargs)
+    finally:
+        profiler.dump_stats(path)
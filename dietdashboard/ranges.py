@@ -0,0 +1,81 @@
+"""Achievable range of each nutrient for a set of products within a cost budget.
+
+For nutrient i the range is [min A_i @ x, max A_i @ x] over the baskets x >= 0 with  price @ x <= budget  that meet the
+bounds of the other selected nutrients. That is two small LPs per nutrient, solved one after the other in the solver
+pool worker of the request (dietdashboard/executor.py), so a range request uses a single process.
+Without other bounds the range has a closed form: from 0 to the budget spent on the product with the most of the
+nutrient per euro, computed for all nutrients at once.
+"""
+
+import time
+
+import numpy as np
+from scipy.optimize import linprog
+
+from dietdashboard.scaling import LP_SCALING, scale_problem, unscale_result
+
+RANGES_LP_METHOD = "revised simplex"  # As the optimization, HiGHS is not consistently faster on these small dense LPs
+
+
+def closed_form_ranges(A: np.ndarray, price: np.ndarray, budget: float) -> tuple[np.ndarray, np.ndarray]:
+    """Ranges without other bounds: the whole budget spent on the best product per euro (A is nutrients x products)."""
+    per_euro = A / price
+    return np.zeros(A.shape[0]), budget * per_euro.max(axis=1, initial=0)
+
+
+def solve_lp(c: np.ndarray, A_ub: np.ndarray, b_ub: np.ndarray, scaling: bool = LP_SCALING):
+    if not scaling:
+        return linprog(c, A_ub=A_ub, b_ub=b_ub, bounds=(0, None), method=RANGES_LP_METHOD)
+    A_scaled, b_scaled, c_scaled, row_scale, col_scale = scale_problem(A_ub, b_ub, c)
+    result = linprog(c_scaled, A_ub=A_scaled, b_ub=b_scaled, bounds=(0, None), method=RANGES_LP_METHOD)
+    return unscale_result(result, row_scale, col_scale)
+
+
+def solve_ranges(
+    A: np.ndarray,
+    price: np.ndarray,
+    budget: float,
+    lb: np.ndarray,
+    ub: np.ndarray,
+    rows: list[int],
+    scaling: bool = LP_SCALING,
+    time_limit: float | None = None,
+) -> list[tuple[float, float]]:
+    """Minimize and maximize the given nutrient rows under the budget and the bounds of the other nutrients.
+
+    Bounds equal to 0 (lower) or inf (upper) are not constraints. NaN is returned when the bounds can not be met.
+    TimeoutError is raised when the LPs take more than time_limit seconds (checked between the rows).
+    """
+    deadline = None if time_limit is None else time.monotonic() + time_limit
+    ranges = []
+    for i in rows:
+        if deadline is not None and time.monotonic() > deadline:
+            raise TimeoutError(f"Ranges not solved within {time_limit:g} seconds ({len(ranges)} of {len(rows)} nutrients).")
+        others = np.arange(len(lb)) != i
+        lower_rows, upper_rows = others & (lb > 0), others & np.isfinite(ub)
+        A_ub = np.vstack([price, -A[lower_rows], A[upper_rows]])
+        b_ub = np.concatenate([[budget], -lb[lower_rows], ub[upper_rows]])
+        low = solve_lp(A[i], A_ub, b_ub, scaling)
+        if low.status != 0:
+            ranges.append((np.nan, np.nan))
+            continue
+        high = solve_lp(-A[i], A_ub, b_ub, scaling)
+        ranges.append((max(low.fun, 0.0), -high.fun if high.status == 0 else np.nan))
+    return ranges
+
+
+def achievable_ranges(
+    A: np.ndarray,
+    price: np.ndarray,
+    budget: float,
+    lb: np.ndarray,
+    ub: np.ndarray,
+    scaling: bool = LP_SCALING,
+    time_limit: float | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Lower and upper end of the achievable range of every nutrient (row of A)."""
+    if not np.any(lb > 0) and not np.any(np.isfinite(ub)):
+        return closed_form_ranges(A, price, budget)
+    results = solve_ranges(A, price, budget, lb, ub, list(range(A.shape[0])), scaling, time_limit)
+    ranges = np.array(results, dtype=np.float64).reshape(-1, 2)
+    return ranges[:, 0], ranges[:, 1]
@@ -0,0 +1,56 @@
+"""Row and column equilibration of the LP  min c @ x  s.t.  A_ub @ x <= b_ub, x >= 0.
+
+The nutrient rows range from energy values in the thousands to vitamins around 1e-3, which slows down the simplex and
+can make it numerically unstable. The scaled problem uses  R @ A_ub @ C,  R @ b_ub  and  C @ c  with diagonal R and C
+chosen by Ruiz equilibration, so that the largest absolute value in every row and column is close to 1.
+The solution of the scaled problem is mapped back with  x = C @ x_scaled,  slack = slack_scaled / R  and
+marginals = R @ marginals_scaled  (the objective value is unchanged).
+"""
+
+import numpy as np
+from scipy.optimize import OptimizeResult
+
+LP_SCALING = False  # Scale the simplex LPs (optimization and ranges), off: no gain measured on the real data
+SCALING_ITERATIONS = 10
+SCALING_TOLERANCE = 1e-3  # Stop when all row and column maxima are within this distance of 1
+
+
+def equilibrate(A: np.ndarray, iterations: int = SCALING_ITERATIONS) -> tuple[np.ndarray, np.ndarray]:
+    """Ruiz equilibration, returns the row and column scale factors (empty rows and columns are not scaled)."""
+    row_scale = np.ones(A.shape[0])
+    col_scale = np.ones(A.shape[1])
+    abs_A = np.abs(A)
+    for _ in range(iterations):
+        scaled = abs_A * row_scale[:, None]
+        scaled *= col_scale
+        row_max, col_max = scaled.max(axis=1), scaled.max(axis=0)
+        maxima = np.concatenate([row_max[row_max > 0], col_max[col_max > 0]])
+        if np.all(np.abs(maxima - 1) < SCALING_TOLERANCE):
+            break
+        row_scale /= np.sqrt(np.where(row_max > 0, row_max, 1))
+        col_scale /= np.sqrt(np.where(col_max > 0, col_max, 1))
+    return row_scale, col_scale
+
+
+def scale_problem(
+    A_ub: np.ndarray, b_ub: np.ndarray, c: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Return the scaled A_ub, b_ub and c with the row and column scale factors."""
+    row_scale, col_scale = equilibrate(A_ub)
+    A_scaled = A_ub * row_scale[:, None]
+    A_scaled *= col_scale
+    return A_scaled, b_ub * row_scale, c * col_scale, row_scale, col_scale
+
+
+def unscale_result(result: OptimizeResult, row_scale: np.ndarray, col_scale: np.ndarray) -> OptimizeResult:
+    """Map the solution, slacks and duals (when the solver returns them) of the scaled problem back, in place."""
+    if result.x is not None:
+        result.x = result.x * col_scale
+    if result.get("slack") is not None:
+        result.slack = result.slack / row_scale
+    if (ineqlin := result.get("ineqlin")) is not None:
+        ineqlin.marginals = ineqlin.marginals * row_scale
+        ineqlin.residual = ineqlin.residual / row_scale
+    if (lower := result.get("lower")) is not None:  # Reduced costs of the bounds x >= 0
+        lower.marginals = lower.marginals / col_scale
+    return result
@@ -0,0 +1,115 @@
+"""Product search over the inverted index of queries/search.sql, kept in memory for search-as-you-type.
+
+The terms are sorted, so the terms starting with a prefix are the contiguous range found by bisection, and their
+postings are one contiguous slice. The score of a product for a query term is
+    field weight * (1 + log(term count)) * idf
+summed over the fields, with idf = log(1 + number of rows / number of rows with the term). Prefix matches (terms that
+only start with the query term) count PREFIX_WEIGHT of an exact match, and a product keeps its best matching term.
+Every query term has to match, the scores of the query terms are added.
+The rows are one per product and location (see queries/search.sql), so a result is an LP column, and excluding its
+price_id from an optimization excludes all the prices of the product at the location (same_column), whatever the
+price policy and snapshot.
+"""
+
+import bisect
+import re
+import unicodedata
+
+import duckdb
+import numpy as np
+
+FIELD_WEIGHTS = {"product_name": 3.0, "ciqual_name": 2.0, "category": 1.0}
+PREFIX_WEIGHT = 0.5
+MIN_PREFIX_LENGTH = 2  # Shorter query terms only match exactly
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+TERM_SPLIT_REGEX = re.compile(r"[^a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase, strip the accents and split on everything that is not a letter or digit (as in queries/search.sql)."""
+    stripped = "".join(c for c in unicodedata.normalize("NFKD", text.lower()) if not unicodedata.combining(c))
+    return [term for term in TERM_SPLIT_REGEX.split(stripped) if term]
+
+
+class SearchIndex:
+    def __init__(self, con: duckdb.DuckDBPyConnection):
+        rows = con.sql("""SELECT price_id, location_id, product_code, product_name, ciqual_name, location_osm_display_name
+                          FROM final_table_price
+                          WHERE price_id IN (SELECT row_price_id FROM search_rows)
+                          ORDER BY price_id""").fetchnumpy()
+        self.price_ids = rows["price_id"].astype(np.int64)
+        self.location_ids = rows["location_id"]
+        self.product_codes = rows["product_code"]
+        self.product_names = rows["product_name"]
+        self.ciqual_names = rows["ciqual_name"]
+        self.locations = np.array([", ".join(str(n).split(", ")[:3]) for n in rows["location_osm_display_name"]], dtype=object)
+        all_rows = con.sql("SELECT price_id, row_price_id FROM search_rows ORDER BY price_id").fetchnumpy()
+        self.all_price_ids = all_rows["price_id"].astype(np.int64)
+        self.all_row_price_ids = all_rows["row_price_id"].astype(np.int64)
+
+        postings = con.sql("""SELECT term, price_id, field, term_count
+                              FROM search_terms ORDER BY term, price_id, field""").fetchnumpy()
+        field_weights = np.array([FIELD_WEIGHTS[f] for f in postings["field"]])
+        weights = field_weights * (1 + np.log(postings["term_count"]))
+        # Sum the fields of each (term, price_id)
+        terms, price_ids = postings["term"], postings["price_id"].astype(np.int64)
+        new = np.ones(len(terms), dtype=bool)
+        new[1:] = (terms[1:] != terms[:-1]) | (price_ids[1:] != price_ids[:-1])
+        starts = np.flatnonzero(new)
+        weights = np.add.reduceat(weights, starts) if len(starts) else weights
+        terms, price_ids = terms[starts], price_ids[starts]
+
+        term_starts = np.flatnonzero(np.concatenate([[True], terms[1:] != terms[:-1]])) if len(terms) else starts
+        self.terms: list[str] = terms[term_starts].tolist()
+        self.offsets = np.append(term_starts, len(terms))
+        document_frequency = np.diff(self.offsets)
+        idf = np.log(1 + len(self.price_ids) / np.maximum(document_frequency, 1))
+        self.rows = np.searchsorted(self.price_ids, price_ids)
+        self.scores = weights * np.repeat(idf, document_frequency)
+
+    def same_column(self, price_ids: np.ndarray) -> np.ndarray:
+        """All the price IDs of the products at the locations of the price IDs (unknown price IDs are kept as is)."""
+        row_price_ids = self.all_row_price_ids[np.isin(self.all_price_ids, price_ids)]
+        return np.union1d(price_ids, self.all_price_ids[np.isin(self.all_row_price_ids, row_price_ids)])
+
+    def match(self, term: str) -> tuple[np.ndarray, np.ndarray]:
+        """Rows that match the query term and their score, sorted by row."""
+        start = bisect.bisect_left(self.terms, term)
+        exact = start < len(self.terms) and self.terms[start] == term
+        end = bisect.bisect_left(self.terms, term + "\U0010ffff") if len(term) >= MIN_PREFIX_LENGTH else start + exact
+        rows = self.rows[self.offsets[start] : self.offsets[end]]
+        scores = self.scores[self.offsets[start] : self.offsets[end]] * PREFIX_WEIGHT
+        if exact:
+            scores[: self.offsets[start + 1] - self.offsets[start]] /= PREFIX_WEIGHT
+        # Keep the best matching term of each row
+        order = np.lexsort((scores, rows))
+        rows, scores = rows[order], scores[order]
+        last = np.ones(len(rows), dtype=bool)
+        last[:-1] = rows[1:] != rows[:-1]
+        return rows[last], scores[last]
+
+    def search(self, query: str, locations: list[int] | None = None, limit: int = SEARCH_LIMIT) -> dict[str, np.ndarray]:
+        """The best rows for the query (at the locations if given), as columns sorted by decreasing score."""
+        rows, scores = np.array([], dtype=np.intp), np.array([])
+        for i, term in enumerate(tokenize(query)):
+            term_rows, term_scores = self.match(term)
+            if i == 0:
+                rows, scores = term_rows, term_scores
+                continue
+            rows, left, right = np.intersect1d(rows, term_rows, assume_unique=True, return_indices=True)
+            scores = scores[left] + term_scores[right]
+        if locations is not None:
+            at_locations = np.isin(self.location_ids[rows], locations)
+            rows, scores = rows[at_locations], scores[at_locations]
+        best = np.lexsort((self.price_ids[rows], -scores))[:limit]
+        rows, scores = rows[best], scores[best]
+        return {
+            "price_id": self.price_ids[rows],
+            "product_code": self.product_codes[rows],
+            "product_name": self.product_names[rows],
+            "ciqual_name": self.ciqual_names[rows],
+            "location_id": self.location_ids[rows],
+            "location": self.locations[rows],
+            "score": scores.round(4),
+        }
@@ -0,0 +1,52 @@
+"""Sensitivity of an optimal basket: the duals of the LP and the reduced costs of the products outside the basket.
+
+For the LP  min c @ x  s.t.  A_ub @ x <= b_ub, x >= 0  the duals y <= 0 are zero on the rows with slack and satisfy
+A_ub[active, basic].T @ y[active] = c[basic]  for the products in the basket (complementary slackness).
+The reduced cost  d = c - A_ub.T @ y  of a product outside the basket is how much its objective coefficient has to
+decrease before it would enter the basket, which ranks it as a substitute.
+The duals are the marginals of the solver when it returns them (HiGHS, PDLP, converged column generation). The revised
+simplex does not, so the LP restricted to the products in the basket (a few columns) is solved again by HiGHS for its
+exact marginals, the basket is also optimal for that LP.
+"""
+
+import numpy as np
+from scipy.optimize import OptimizeResult, linprog
+
+SUBSTITUTES_K = 3  # Number of substitutes suggested per product in the basket
+
+
+def support_duals(A_ub: np.ndarray, b_ub: np.ndarray, c: np.ndarray, x: np.ndarray, x_threshold: float) -> np.ndarray:
+    """Duals of the inequality rows, the marginals of the LP restricted to the products in the basket (zero if it fails)."""
+    basket = x > x_threshold
+    result = linprog(c[basket], A_ub=A_ub[:, basket], b_ub=b_ub, bounds=(0, None), method="highs")
+    if result.status != 0:
+        return np.zeros(A_ub.shape[0])
+    return np.minimum(result.ineqlin.marginals, 0)
+
+
+def solution_duals(result: OptimizeResult, A_ub: np.ndarray, b_ub: np.ndarray, c: np.ndarray, x_threshold: float) -> np.ndarray:
+    """Duals of the inequality rows: the marginals of the result when it has them, else from the products in the basket."""
+    ineqlin = result.get("ineqlin")
+    if ineqlin is not None and len(ineqlin.marginals) == A_ub.shape[0]:
+        return np.minimum(ineqlin.marginals, 0)
+    return support_duals(A_ub, b_ub, c, result.x, x_threshold)
+
+
+def reduced_costs(A_ub: np.ndarray, c: np.ndarray, y: np.ndarray) -> np.ndarray:
+    return np.maximum(c - A_ub.T @ y, 0)
+
+
+def substitutes(reduced: np.ndarray, chosen: np.ndarray, groups: np.ndarray, k: int = SUBSTITUTES_K) -> list[np.ndarray]:
+    """For each chosen product the k products of the same group (e.g. Ciqual food) outside the basket with the lowest
+    reduced cost, products without a group (negative) get no substitutes."""
+    outside = np.ones(len(reduced), dtype=bool)
+    outside[chosen] = False
+    order = np.argsort(reduced, kind="stable")
+    order = order[outside[order]]
+    result = []
+    for j in chosen:
+        if groups[j] < 0:
+            result.append(np.array([], dtype=np.intp))
+            continue
+        result.append(order[groups[order] == groups[j]][:k])
+    return result
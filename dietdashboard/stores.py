@@ -0,0 +1,183 @@
+"""Basket optimization with a cost per store visited and a maximum number of stores.
+
+With a binary variable z_s per store, the MIP is
+    min c @ x + store_cost * sum(z)  s.t.  A_ub @ x <= b_ub,  x_j <= M_j * z_store(j),  sum(z) <= max_stores,  x >= 0
+where M_j is the largest quantity of product j in an optimal basket, derived from the nutrient bounds (quantity_bounds).
+
+A fast heuristic is seeded by the LP relaxation (the basket without store costs): its stores are ranked by their share
+of the LP basket, and the baskets over the first 1, 2, ... stores of the ranking (at most max_stores) are one LP each,
+the best total cost is kept. The heuristic gets at most HEURISTIC_TIME_SHARE of the time limit, checked before each LP.
+Unless the heuristic basket reaches the lower bound of the LP relaxation (with one store), the MIP is then solved with
+HiGHS for the rest of the time limit, and the best of the two baskets is kept.
+"""
+
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import OptimizeResult, linprog, milp
+
+STORES_LP_METHOD = "highs"
+STORES_TIME_LIMIT = 1.0  # Seconds, for the heuristic and the MIP together
+HEURISTIC_TIME_SHARE = 0.5  # Of the time limit, the rest is left to the MIP
+STORE_THRESHOLD = 1e-3  # Minimum quantity (in 100 g) of a product for its store to be visited
+OPTIMALITY_GAP = 1e-4  # Relative gap to the lower bound under which the heuristic basket is kept without the MIP
+
+
+def quantity_bounds(A_ub: np.ndarray, b_ub: np.ndarray, c: np.ndarray, best_total: float) -> np.ndarray:
+    """Largest quantity of each product in an optimal basket, from the bounds (rows of A_ub: -A for the lower bounds,
+    A for the upper bounds) and the cost of the best basket found (best_total).
+
+    A product does not exceed the quantity allowed by each upper bound. With nonnegative nutrients and a nonnegative
+    cost, it does not exceed the quantity that meets alone every lower bound it contributes to either (a basket with
+    more of it costs more and meets the same lower bounds with less), and it does not cost more than best_total.
+    Products that contribute to no lower bound are then not needed (0).
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        limits = np.where(A_ub > 0, b_ub[:, None] / A_ub, np.inf)
+        M = limits.min(axis=0, initial=np.inf)
+        if np.all(A_ub[A_ub.shape[0] // 2 :] >= 0):
+            needed = np.where(A_ub < 0, b_ub[:, None] / A_ub, 0).max(axis=0, initial=0)
+            M = np.where(c >= 0, np.minimum(M, needed), M)
+        if np.all(c >= 0) and np.isfinite(best_total):
+            M = np.minimum(M, np.where(c > 0, best_total / c, np.inf))
+    return np.maximum(M, 0)
+
+
+def solve_at_stores(A_ub: np.ndarray, b_ub: np.ndarray, c: np.ndarray, at_stores: np.ndarray) -> np.ndarray | None:
+    """Basket of the LP over the products of the stores, None if these products can not meet the bounds."""
+    columns = np.flatnonzero(at_stores)
+    if len(columns) == 0:
+        return None
+    result = linprog(c[columns], A_ub=A_ub[:, columns], b_ub=b_ub, bounds=(0, None), method=STORES_LP_METHOD)
+    if result.status != 0:
+        return None
+    x = np.zeros(len(c))
+    x[columns] = result.x
+    return x
+
+
+def rank_stores(c: np.ndarray, product_stores: np.ndarray, x_relaxed: np.ndarray) -> np.ndarray:
+    """Stores of the LP basket by decreasing share of it: of its cost, or of its quantity when it costs nothing."""
+    in_basket = x_relaxed > STORE_THRESHOLD
+    share = np.abs(c[in_basket] * x_relaxed[in_basket])
+    if share.sum() <= 0:
+        share = x_relaxed[in_basket]
+    stores, index = np.unique(product_stores[in_basket], return_inverse=True)
+    return stores[np.argsort(-np.bincount(index.ravel(), weights=share), kind="stable")]
+
+
+def best_store_prefix(
+    A_ub: np.ndarray,
+    b_ub: np.ndarray,
+    c: np.ndarray,
+    product_stores: np.ndarray,
+    x_relaxed: np.ndarray,
+    store_cost: float,
+    max_stores: int | None,
+    deadline: float,
+) -> tuple[np.ndarray | None, int]:
+    """Heuristic from the ranking of the stores of the LP relaxation, returns the best basket over the first stores of
+    the ranking (None if none found) and the number of LPs solved."""
+    ranking = rank_stores(c, product_stores, x_relaxed)
+    if max_stores is None or len(ranking) <= max_stores:  # The LP basket itself is a candidate
+        best, best_total = x_relaxed, c @ x_relaxed + store_cost * len(ranking)
+    else:
+        best, best_total = None, np.inf
+    num_lps = 0
+    for k in range(1, min(len(ranking), max_stores if max_stores is not None else len(ranking) + 1) + 1):
+        if k == len(ranking) or store_cost * k >= best_total or time.perf_counter() > deadline:
+            break  # The LP basket, or no basket with more stores is cheaper, or out of time
+        candidate = solve_at_stores(A_ub, b_ub, c, np.isin(product_stores, ranking[:k]))
+        num_lps += 1
+        if candidate is None:
+            continue
+        total = c @ candidate + store_cost * len(np.unique(product_stores[candidate > STORE_THRESHOLD]))
+        if total < best_total:
+            best, best_total = candidate, total
+    return best, num_lps
+
+
+def solve_store_mip(
+    A_ub: np.ndarray,
+    b_ub: np.ndarray,
+    c: np.ndarray,
+    product_stores: np.ndarray,
+    store_cost: float,
+    max_stores: int | None,
+    time_limit: float,
+    best_total: float = np.inf,
+) -> np.ndarray | None:
+    """Basket of the MIP with binary store variables within the time limit, None if no feasible basket was found."""
+    num_rows, num_products = A_ub.shape
+    stores, store_index = np.unique(product_stores, return_inverse=True)
+    num_stores = len(stores)
+    M = quantity_bounds(A_ub, b_ub, c, best_total)
+    if not np.all(np.isfinite(M)):  # Only with a negative cost and no upper bound, the LP relaxation is unbounded
+        return None
+    # x_j - M_j * z_store(j) <= 0
+    linking = sp.hstack([sp.eye_array(num_products), sp.csr_array((-M, (np.arange(num_products), store_index.ravel())))])
+    constraints = [  # (A, lb, ub) tuples, as LinearConstraint(A, lb, ub)
+        (sp.hstack([sp.csr_array(A_ub), sp.csr_array((num_rows, num_stores))]), -np.inf, b_ub),
+        (linking, -np.inf, np.zeros(num_products)),
+    ]
+    if max_stores is not None:
+        constraints.append((np.concatenate([np.zeros(num_products), np.ones(num_stores)]), 0, max_stores))
+    result = milp(
+        np.concatenate([c, np.full(num_stores, store_cost)]),
+        constraints=constraints,
+        integrality=np.concatenate([np.zeros(num_products), np.ones(num_stores)]),
+        bounds=(0, np.concatenate([M, np.ones(num_stores)])),
+        options={"time_limit": max(time_limit, 0.0), "mip_rel_gap": OPTIMALITY_GAP},
+    )
+    if result.x is None:
+        return None
+    return result.x[:num_products]
+
+
+def solve_stores(
+    A_ub: np.ndarray,
+    b_ub: np.ndarray,
+    c: np.ndarray,
+    product_stores: np.ndarray,
+    x_relaxed: np.ndarray,
+    store_cost: float = 0.0,
+    max_stores: int | None = None,
+    time_limit: float = STORES_TIME_LIMIT,
+) -> OptimizeResult:
+    """Basket with the store costs from the LP relaxation x_relaxed, product_stores is the store of each product.
+
+    The result has x and slack, fun (the cost of the products), the stores visited and their total cost, the method
+    that found the basket (heuristic or mip) and the number of LPs solved by the heuristic.
+    """
+    start = time.perf_counter()
+    deadline = start + time_limit
+    heuristic_deadline = start + HEURISTIC_TIME_SHARE * time_limit
+    x, num_lps = best_store_prefix(A_ub, b_ub, c, product_stores, x_relaxed, store_cost, max_stores, heuristic_deadline)
+    method = "heuristic"
+
+    def total_cost(basket: np.ndarray) -> float:
+        return float(c @ basket + store_cost * len(np.unique(product_stores[basket > STORE_THRESHOLD])))
+
+    # The LP relaxation with one store visited is a lower bound, the MIP is skipped when the heuristic reaches it
+    best_total = total_cost(x) if x is not None else np.inf
+    if best_total > (c @ x_relaxed + store_cost) * (1 + OPTIMALITY_GAP):
+        time_left = deadline - time.perf_counter()
+        x_mip = solve_store_mip(A_ub, b_ub, c, product_stores, store_cost, max_stores, time_left, best_total)
+        if x_mip is not None and total_cost(x_mip) < best_total:
+            x, method = x_mip, "mip"
+    if x is None:
+        message = f"No basket from at most {max_stores} stores meets the bounds (within the time limit)."
+        return OptimizeResult(status=2, message=message, nit=num_lps)
+    stores = np.unique(product_stores[x > STORE_THRESHOLD])
+    return OptimizeResult(
+        x=x,
+        fun=float(c @ x),
+        slack=b_ub - A_ub @ x,
+        status=0,
+        message=f"Optimization terminated successfully. (Basket from {len(stores)} stores, by the {method}.)",
+        stores=stores,
+        store_cost=store_cost * len(stores),
+        method=method,
+        nit=num_lps,
+    )
@@ -0,0 +1,23 @@
+/* Sparse category by location price matrix of the price comparison (/comparison), see dietdashboard/comparison.py.
+One row per nonzero entry: the lowest price per kg (EUR) of a comparison category (compared_to_category of Open Food
+Facts) at a location, for every location at once, and the price ID of that price. Sorted by location, so the entries
+of a location are contiguous (one column of the matrix). */
+CREATE OR REPLACE TABLE comparison_prices AS (
+  SELECT
+    pr.location_id,
+    p.compared_to_category AS category,
+    arg_min(pr.id, (1000 * pr.price / p.product_quantity / ex.rate, pr.id)) AS price_id,
+    round(min(1000 * pr.price / p.product_quantity / ex.rate), 2) AS price,
+  FROM prices AS pr
+  JOIN products AS p ON pr.product_code = p.code
+  JOIN euro_exchange_rates ex ON pr.currency = ex.currency
+  WHERE pr.location_id IS NOT NULL
+    AND p.product_quantity > 0
+    AND p.compared_to_category IS NOT NULL
+  GROUP BY pr.location_id, p.compared_to_category
+  ORDER BY pr.location_id, category
+);
+COMMENT ON TABLE comparison_prices IS 'Lowest price per kg of each comparison category at each location (sparse matrix entries)';
+COMMENT ON COLUMN comparison_prices.category IS 'Open Food Facts compared_to_category of the products';
+COMMENT ON COLUMN comparison_prices.price_id IS 'Open Prices ID of the lowest price';
+COMMENT ON COLUMN comparison_prices.price IS 'Lowest price in EUR/kg';
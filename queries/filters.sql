@@ -0,0 +1,42 @@
+/* Rows of final_table_price in price_id order, with the values used by the filters.
+The position of a row in this order (row_index) is its bit in the bitmaps of filter_bitmaps. */
+CREATE OR REPLACE TABLE filter_rows AS (
+  SELECT
+  (row_number() OVER (ORDER BY f.price_id) - 1)::INTEGER AS row_index,
+  f.price_id,
+  f.ciqual_group_code,
+  f.ciqual_subgroup_code,
+  CAST(p.nova_group AS VARCHAR) AS nova_group,
+  p.allergens_tags,
+  list_contains(p.ingredients_analysis_tags, 'en:vegan') OR list_contains(p.labels_tags, 'en:vegan') AS vegan,
+  list_contains(p.ingredients_analysis_tags, 'en:vegetarian') OR list_contains(p.labels_tags, 'en:vegetarian')
+    OR list_contains(p.ingredients_analysis_tags, 'en:vegan') OR list_contains(p.labels_tags, 'en:vegan') AS vegetarian,
+  FROM final_table_price AS f
+  LEFT JOIN products AS p ON p.code = f.product_code
+);
+COMMENT ON TABLE filter_rows IS 'Rows of final_table_price in price_id order, row_index is the bit of the row in filter_bitmaps';
+
+/* One bitmap per filter value over the rows of filter_rows, bit i is set when the row with row_index i has the value.
+bitstring_agg takes its bounds from the statistics of row_index (0 to the number of rows - 1), so all bitmaps have the
+same length (it only accepts constant bounds, the length is checked against the rows in dietdashboard/filters.py).
+As BLOB the first byte is padded with (-length % 8) leading bits, see dietdashboard/filters.py. */
+CREATE OR REPLACE TABLE filter_bitmaps AS (
+  WITH memberships AS (
+    SELECT 'diet' AS filter, 'vegan' AS value, row_index FROM filter_rows WHERE vegan
+    UNION ALL
+    SELECT 'diet' AS filter, 'vegetarian' AS value, row_index FROM filter_rows WHERE vegetarian
+    UNION ALL
+    SELECT 'ciqual_group' AS filter, ciqual_group_code AS value, row_index FROM filter_rows WHERE ciqual_group_code IS NOT NULL
+    UNION ALL
+    SELECT 'ciqual_subgroup' AS filter, ciqual_subgroup_code AS value, row_index FROM filter_rows WHERE ciqual_subgroup_code IS NOT NULL
+    UNION ALL
+    SELECT 'nova' AS filter, nova_group AS value, row_index FROM filter_rows WHERE nova_group IS NOT NULL
+    UNION ALL
+    SELECT 'allergen' AS filter, UNNEST(allergens_tags) AS value, row_index FROM filter_rows
+  )
+  SELECT filter, value, count(*) AS num_rows, CAST(bitstring_agg(row_index) AS BLOB) AS bitmap
+  FROM memberships
+  GROUP BY filter, value
+  ORDER BY filter, value
+);
+COMMENT ON TABLE filter_bitmaps IS 'Bitmap of the rows of filter_rows that match each filter value (diet, Ciqual group, NOVA, allergen)';
@@ -54,19 +54,21 @@ Illustration of ciqual_compo:
 │     20904 │      25000 │ A              │       83108 │  6.84 │  NULL │  13.4 │
 └───────────┴────────────┴────────────────┴─────────────┴───────┴───────┴───────┘
 */
+-- The Ciqual tables are converted from XML to Parquet with all columns as strings, the codes are cast to integers
 CREATE OR REPLACE TABLE ciqual_alim AS (
-  SELECT alim_code, alim_nom_eng, alim_grp_code, alim_ssgrp_code, alim_ssssgrp_code
-  FROM read_csv('data/ciqual2020/alim.csv')
+  SELECT CAST(alim_code AS BIGINT) AS alim_code, alim_nom_eng, alim_grp_code, alim_ssgrp_code, alim_ssssgrp_code
+  FROM read_parquet('data/ciqual2020/alim.parquet')
 );
 CREATE OR REPLACE TABLE ciqual_compo AS (
-  SELECT alim_code, const_code, code_confiance, source_code,
+  SELECT CAST(alim_code AS BIGINT) AS alim_code, CAST(const_code AS BIGINT) AS const_code, code_confiance,
+  CAST(source_code AS BIGINT) AS source_code,
   CASE WHEN min = '-' THEN NULL ELSE CAST(REPLACE(REPLACE(min, 'traces', '0'), ',', '.') AS FLOAT) END AS lb,
   CASE WHEN max = '-' THEN NULL ELSE CAST(REPLACE(REPLACE(max, 'traces', '0'), ',', '.') AS FLOAT) END AS ub,
   CASE WHEN teneur = '-' THEN NULL ELSE CAST(REPLACE(REPLACE(teneur, 'traces', '0'), ',', '.') AS FLOAT) END AS mean
-  FROM read_csv('data/ciqual2020/compo.csv')
+  FROM read_parquet('data/ciqual2020/compo.parquet')
 );
 CREATE OR REPLACE TABLE ciqual_sources AS (
-  SELECT source_code, ref_citation FROM read_csv('data/ciqual2020/sources.csv')
+  SELECT CAST(source_code AS BIGINT) AS source_code, ref_citation FROM read_parquet('data/ciqual2020/sources.parquet')
 );
 /* Table 0 contains food group information (2 119 rows)
 Table 1 contains nutrient information for each food and nutrient (131 378 rows)
@@ -190,7 +192,12 @@ Illustration of products:
 │ 4099200179193 │            350.0 │ [{'lang': main, 't…  │ g                    │              350.0 │            20904 │                      │ [{'name': energy, 'value': 528.0, '100g'…  │
 └───────────────┴──────────────────┴──────────────────────┴──────────────────────┴────────────────────┴──────────────────┴──────────────────────┴────────────────────────────────────────────┘
 */
+/* Only the products that have a price are loaded (a small fraction of the ~4M rows of products.parquet).
+The semi-join with the price codes is applied during the Parquet scan (as a join filter) and only the used
+columns and struct fields are read, the raw categories columns are not loaded.
+To query all the products, read data/products.parquet directly (as in the unit-* commands in the Makefile). */
 CREATE OR REPLACE TABLE products AS (
+  WITH priced_codes AS (SELECT DISTINCT product_code AS code FROM prices WHERE product_code IS NOT NULL)
   SELECT
   code,
   countries_tags,
@@ -202,10 +209,11 @@ CREATE OR REPLACE TABLE products AS (
   product_quantity_unit,
   CAST(product_quantity AS FLOAT) AS product_quantity,
   quantity AS quantity_str,
-  categories,
   categories_tags,
   compared_to_category,
-  categories_properties,
+  ingredients_analysis_tags,  -- Used for the diet filters (en:vegan, en:vegetarian) in filters.sql
+  labels_tags,
+  allergens_tags,
   COALESCE(
       categories_properties.ciqual_food_code,
       categories_properties.agribalyse_food_code,
@@ -218,4 +226,5 @@ CREATE OR REPLACE TABLE products AS (
       ELSE 'unknown'
   END AS ciqual_food_code_origin,
   FROM read_parquet('data/products.parquet')
+  SEMI JOIN priced_codes USING (code)
 );
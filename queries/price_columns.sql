@@ -0,0 +1,71 @@
+/* One LP column per product and location under each price policy, in monthly as-of snapshots.
+final_table_price has one row per price, so a product priced many times at a location gives identical nutrient
+columns in the LP. For each snapshot date as_of, (product_code, location_id) and policy this keeps one price, from
+the prices of the year up to as_of, and the price_id of the row that represents it (whose nutrients and display
+columns are used). In the current snapshot a product without a price in the year keeps its last known price (the
+prices of its last price date), so that it is still a candidate of the default optimization:
+  latest: the price with the latest price_date (and highest price_id)
+  median: the median price, represented by the row with the price closest to it
+  min:    the lowest price
+The snapshots are the end of every month before the last price, and the date of the last price (the current snapshot,
+used by default). price_ids keeps the provenance of the current snapshot: every price_id in its window, latest first
+(shown on /info). The table is sorted by as_of and policy, so a query of one snapshot only reads its slice. */
+CREATE OR REPLACE TABLE price_columns AS (
+  WITH snapshots AS (
+    SELECT last_day(UNNEST(generate_series(date_trunc('month', min(price_date)), max(price_date), INTERVAL 1 MONTH)))::DATE AS as_of
+    FROM final_table_price
+  ),
+  current_snapshot AS (
+    SELECT max(price_date) AS as_of FROM final_table_price
+  ),
+  prices AS (
+    SELECT *, max(price_date) OVER (PARTITION BY product_code, location_id) AS last_price_date
+    FROM final_table_price
+    WHERE price IS NOT NULL
+  ),
+  windowed AS (
+    SELECT
+    s.as_of,
+    f.price_id,
+    f.product_code,
+    f.location_id,
+    f.price,
+    f.price_date,
+    median(f.price) OVER (PARTITION BY s.as_of, f.product_code, f.location_id) AS median_price,
+    FROM (
+      SELECT as_of FROM snapshots WHERE as_of < (SELECT as_of FROM current_snapshot)
+      UNION
+      SELECT as_of FROM current_snapshot
+    ) AS s
+    JOIN prices AS f ON f.price_date <= s.as_of AND (
+      f.price_date >= s.as_of - INTERVAL 365 DAY
+      OR (s.as_of = (SELECT as_of FROM current_snapshot) AND f.price_date = f.last_price_date)
+    )
+  ),
+  grouped AS (
+    SELECT
+    as_of,
+    product_code,
+    location_id,
+    arg_max(price_id, (price_date, price_id)) AS latest_price_id,
+    arg_max(price, (price_date, price_id)) AS latest_price,
+    arg_min(price_id, (abs(price - median_price), price_id)) AS median_price_id,
+    any_value(median_price) AS median_price,
+    arg_min(price_id, (price, price_id)) AS min_price_id,
+    min(price) AS min_price,
+    CASE WHEN as_of = (SELECT as_of FROM current_snapshot) THEN list(price_id ORDER BY price_date DESC, price_id DESC) END AS price_ids,
+    FROM windowed
+    GROUP BY as_of, product_code, location_id
+  )
+  SELECT as_of, 'latest' AS policy, latest_price_id AS price_id, latest_price AS price, price_ids FROM grouped
+  UNION ALL
+  SELECT as_of, 'median' AS policy, median_price_id AS price_id, median_price AS price, price_ids FROM grouped
+  UNION ALL
+  SELECT as_of, 'min' AS policy, min_price_id AS price_id, min_price AS price, price_ids FROM grouped
+  ORDER BY as_of, policy, price_id
+);
+COMMENT ON TABLE price_columns IS 'One price per product, location and policy (latest, median, min) in monthly as-of snapshots of a year of prices';
+COMMENT ON COLUMN price_columns.as_of IS 'Snapshot date: end of a month, or the date of the last price for the current snapshot';
+COMMENT ON COLUMN price_columns.price_id IS 'Price ID of the row of final_table_price that represents the column';
+COMMENT ON COLUMN price_columns.price IS 'Price in EUR/100g under the policy';
+COMMENT ON COLUMN price_columns.price_ids IS 'All the price IDs of the product at the location within the window (or of its last price date), latest first (current snapshot only)';
@@ -0,0 +1,15 @@
+-- Prices collapsed into the LP column of the product and location of $price_id in the current snapshot
+-- (see price_columns.sql), latest first.
+SELECT
+price_id,
+price_date,
+product_price,
+product_currency,
+price,
+FROM final_table_price
+WHERE price_id IN (
+  SELECT UNNEST(any_value(price_ids))
+  FROM price_columns
+  WHERE as_of = (SELECT max(as_of) FROM price_columns) AND list_contains(price_ids, $price_id)
+)
+ORDER BY price_date DESC, price_id DESC;
@@ -1,16 +1,19 @@
 SELECT
-$objective as objective,
-COLUMNS($nutrient_ids),
+CAST($objective AS DOUBLE) AS objective,
+COLUMNS($nutrient_ids)::DOUBLE,
 price_id,
-product_code,
-product_name,
-ciqual_code,
-ciqual_name,
-color,
 price,
-location_osm_display_name,
-location_osm_id,
-FROM final_table_price
+location_id,
+COALESCE(ciqual_code, -1) AS ciqual_code,
+COALESCE(TRY_CAST(ciqual_subgroup_code AS INTEGER), -1) AS ciqual_subgroup_code,
+-- One column per product and location, with the price of the policy in the snapshot (see price_columns.sql)
+FROM (
+  SELECT f.* REPLACE (pc.price AS price)
+  FROM final_table_price AS f
+  JOIN price_columns AS pc ON pc.price_id = f.price_id
+  WHERE pc.policy = $policy
+    AND pc.as_of = COALESCE($as_of, (SELECT max(as_of) FROM price_columns))  -- The current snapshot by default
+)
 WHERE price IS NOT NULL
   AND price > 0
   AND location_id IN (SELECT UNNEST($locations))
@@ -0,0 +1,14 @@
+-- Display columns of the products chosen by the optimization, in the order of $price_ids.
+-- Only the numeric inputs of the LP are fetched by query.sql, these are looked up after the solve.
+SELECT
+price_id,
+product_code,
+product_name,
+ciqual_code,
+ciqual_name,
+color,
+location_osm_display_name,
+location_osm_id,
+FROM final_table_price
+WHERE price_id IN (SELECT UNNEST($price_ids))
+ORDER BY list_position($price_ids, price_id);
@@ -0,0 +1,43 @@
+/* Rows of the product search (/search), see dietdashboard/search.py: one per product and location, as the LP columns.
+final_table_price has one row per price, the row of a product at a location is its latest price (latest price_date and
+highest price_id), the price_id that represents the column under the default policy (latest) of the current snapshot
+in price_columns.sql. row_price_id maps every price_id to the row of its product and location. */
+CREATE OR REPLACE TABLE search_rows AS (
+  SELECT
+  price_id,
+  first_value(price_id) OVER (PARTITION BY product_code, location_id ORDER BY price_date DESC, price_id DESC) AS row_price_id,
+  FROM final_table_price
+  WHERE price IS NOT NULL
+  ORDER BY price_id
+);
+COMMENT ON TABLE search_rows IS 'Price ID of the search row (the latest price of the product at the location) of every price ID';
+
+/* Inverted index of the product search.
+The product name, Ciqual name and categories of each search row are lowercased, stripped of accents and split into
+terms on everything that is not a letter or a digit (categories without their language prefix, e.g. en:).
+One row per term, price_id and field, sorted by term so that all the terms with a prefix are one contiguous range. */
+CREATE OR REPLACE TABLE search_terms AS (
+  WITH indexed AS (
+    SELECT * FROM final_table_price WHERE price_id IN (SELECT row_price_id FROM search_rows)
+  ),
+  fields AS (
+    SELECT price_id, 'product_name' AS field, product_name AS text FROM indexed
+    UNION ALL
+    SELECT price_id, 'ciqual_name' AS field, ciqual_name AS text FROM indexed
+    UNION ALL
+    SELECT f.price_id, 'category' AS field, regexp_replace(UNNEST(p.categories_tags), '^[a-z]+:', '') AS text
+    FROM indexed AS f
+    JOIN products AS p ON p.code = f.product_code
+  ),
+  terms AS (
+    SELECT price_id, field, UNNEST(regexp_split_to_array(lower(strip_accents(text)), '[^a-z0-9]+')) AS term
+    FROM fields
+    WHERE text IS NOT NULL
+  )
+  SELECT term, price_id, field, count(*)::INTEGER AS term_count
+  FROM terms
+  WHERE term <> ''
+  GROUP BY term, price_id, field
+  ORDER BY term, price_id, field
+);
+COMMENT ON TABLE search_terms IS 'Inverted index of product_name, ciqual_name and categories, one row per term, search row and field';
@@ -1,19 +1,5 @@
 -- This SQL script generates static data files.
 
--- Locations
-COPY (
-  SELECT
-    location_id AS id,
-    location_osm_lat AS lat,
-    location_osm_lon AS lon,
-    location_osm_display_name AS name,
-    COUNT(*) AS count
-  FROM final_table_price
-  GROUP BY id, lat, lon, name
-  ORDER BY location_id, count DESC
-)
-TO 'dietdashboard/static/locations.csv';
-
 -- Column descriptions
 COPY (
   WITH
@@ -1,11 +1,9 @@
--- Attach the database
-ATTACH DATABASE 'data/data.db' AS data (READONLY);
 -- Nutrient map from CSV
 CREATE TABLE nutrient_map AS SELECT *, ROW_NUMBER() OVER () AS row_num FROM read_csv('data/nutrient_map.csv');
 -- Nutrient counts
 CREATE TABLE nutrient_counts AS
 SELECT n.unnest.name as off_id, count(*) AS count
-FROM data.products, UNNEST(data.products.nutriments) AS n
+FROM read_parquet('data/products.parquet') AS products, UNNEST(products.nutriments) AS n
 GROUP BY n.unnest.name
 ORDER BY count DESC;
 -- Nutrient map with updated counts
@@ -0,0 +1,245 @@
+#!/usr/bin/env -S uv run
+"""This script builds data/data.db from the SQL files in queries/, split into one stage per table.
+
+Each CREATE TABLE statement (with the COMMENT ON statements of the same table) is a stage. The dependencies of a stage
+are the tables it reads that are created by other stages, and the files it reads with read_csv/read_parquet.
+Stages whose dependencies are built run concurrently, each on its own cursor of the database.
+
+A stage is skipped when its fingerprint is unchanged since the last build and its table still has the content it was
+built with (a hash of its rows recorded after the build, so a dropped or edited table is rebuilt). The fingerprint hashes
+the SQL text of the stage, the content of its input files and the fingerprints of the stages it depends on. File hashes
+are computed and cached by (size, mtime) in the database, a file listed in data/checksums.txt whose hash does not match
+is reported (its actual content is what the fingerprint uses).
+
+Usage:
+    ./scripts/build_db.py                       # build all stages that changed
+    ./scripts/build_db.py final_table_price     # build the given stages (and the changed stages they depend on)
+    ./scripts/build_db.py --force recommendations
+    ./scripts/build_db.py --dry-run
+"""
+
+import argparse
+import hashlib
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import duckdb
+import sqlglot
+import sqlglot.expressions as exp
+
+REPO_DIR = Path(__file__).parent.parent
+DATA_DIR = REPO_DIR / "data"
+QUERIES_DIR = REPO_DIR / "queries"
+CHECKSUMS = DATA_DIR / "checksums.txt"
+# The SQL files that make up the database, in the order they were run by the Makefile.
+QUERY_FILES = (
+    "load.sql",
+    "create_table_price.sql",
+    "recommendations.sql",
+    "filters.sql",
+    "search.sql",
+    "price_columns.sql",
+    "comparison_prices.sql",
+)
+MAX_WORKERS = 4
+# Bookkeeping tables of the build, stored in the database next to the built tables.
+BUILD_TABLES = """
+CREATE TABLE IF NOT EXISTS _build_files (path VARCHAR PRIMARY KEY, size BIGINT, mtime_ns BIGINT, sha256 VARCHAR);
+CREATE TABLE IF NOT EXISTS _build_stages (stage VARCHAR PRIMARY KEY, fingerprint VARCHAR, built_at TIMESTAMP, seconds DOUBLE);
+ALTER TABLE _build_stages ADD COLUMN IF NOT EXISTS output_hash VARCHAR;
+"""
+
+
+@dataclass
+class Stage:
+    name: str  # Name of the table created by the stage
+    statements: list[str] = field(default_factory=list)
+    tables: set[str] = field(default_factory=set)  # Tables read by the statements
+    files: set[str] = field(default_factory=set)  # Files read by the statements (relative to the repository)
+    depends_on: list[str] = field(default_factory=list)
+    fingerprint: str = ""
+
+
+def statement_target(expression: exp.Expression) -> str:
+    """The table created or commented on by the statement."""
+    if isinstance(expression, exp.Create):
+        return expression.this.find(exp.Table).name  # type: ignore[reportOptionalMemberAccess]
+    if isinstance(expression, exp.Comment):
+        node = expression.this
+        return node.name if isinstance(node, exp.Table) else node.table
+    raise ValueError(f"Unsupported statement in a build stage: {expression.sql()[:80]}")
+
+
+def parse_stages(query_files: tuple[str, ...]) -> dict[str, Stage]:
+    """Split the query files into stages (one per table) and find the dependencies of each stage."""
+    stages: dict[str, Stage] = {}
+    for query_file in query_files:
+        for statement in duckdb.extract_statements((QUERIES_DIR / query_file).read_text()):
+            expression = sqlglot.parse_one(statement.query, read="duckdb")
+            name = statement_target(expression)
+            stage = stages.setdefault(name, Stage(name))
+            stage.statements.append(statement.query.strip())
+            ctes = {cte.alias for cte in expression.find_all(exp.CTE)}
+            for table in expression.find_all(exp.Table):
+                if table.name:
+                    stage.tables.add(table.name)
+                else:  # Table functions, e.g. read_csv('data/...')
+                    stage.files.update(lit.this for lit in table.find_all(exp.Literal) if lit.is_string)
+            stage.tables -= ctes | {name}
+    for stage in stages.values():
+        stage.depends_on = sorted(stage.tables & stages.keys())
+    return stages
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_hashes(con: duckdb.DuckDBPyConnection, paths: set[str]) -> dict[str, str]:
+    """Hash the input files, from the cache keyed by size and mtime (hashing the rest), and check them against
+    data/checksums.txt."""
+    listed = {}
+    if CHECKSUMS.exists():
+        for line in CHECKSUMS.read_text().splitlines():
+            sha, path = line.split()
+            listed[path] = sha
+    cached = {p: (size, mtime, sha) for p, size, mtime, sha in con.sql("SELECT * FROM _build_files").fetchall()}
+    hashes = {}
+    for path in sorted(paths):
+        if not (REPO_DIR / path).exists():
+            raise FileNotFoundError(f"Input file {path} does not exist, see the Makefile for how to fetch it.")
+        stat = (REPO_DIR / path).stat()
+        if path in cached and cached[path][:2] == (stat.st_size, stat.st_mtime_ns):
+            hashes[path] = cached[path][2]
+        else:
+            start = time.perf_counter()
+            hashes[path] = file_sha256(REPO_DIR / path)
+            print(f"Hashed {path} in {time.perf_counter() - start:.2f}s")
+            row = [path, stat.st_size, stat.st_mtime_ns, hashes[path]]
+            con.execute("INSERT OR REPLACE INTO _build_files VALUES (?, ?, ?, ?)", row)
+        if path in listed and listed[path] != hashes[path]:
+            print(f"Warning: {path} does not match its checksum in {CHECKSUMS.relative_to(REPO_DIR)}")
+    return hashes
+
+
+def table_hash(con: duckdb.DuckDBPyConnection, name: str) -> str:
+    """Hash of the rows of a table (independent of their order) and their number."""
+    count, total = con.sql(f"SELECT count(*), sum(hash(t)) FROM {name} AS t").fetchone()  # type: ignore[reportOptionalIterable]
+    return f"{count}:{total}"
+
+
+def compute_fingerprints(stages: dict[str, Stage], hashes: dict[str, str]) -> None:
+    """Fingerprint each stage from its SQL, its input files and the fingerprints of its dependencies."""
+
+    def fingerprint(stage: Stage) -> str:
+        if not stage.fingerprint:
+            h = hashlib.sha256()
+            for statement in stage.statements:
+                h.update(statement.encode())
+            for path in sorted(stage.files):
+                h.update(f"{path}:{hashes[path]}".encode())
+            for dependency in stage.depends_on:
+                h.update(f"{dependency}:{fingerprint(stages[dependency])}".encode())
+            stage.fingerprint = h.hexdigest()
+        return stage.fingerprint
+
+    for stage in stages.values():
+        fingerprint(stage)
+
+
+def with_dependencies(stages: dict[str, Stage], targets: list[str]) -> list[str]:
+    """The targets and all the stages they depend on, in dependency order."""
+    ordered: list[str] = []
+
+    def visit(name: str):
+        if name not in stages:
+            raise ValueError(f"Unknown stage {name}, available stages: {', '.join(stages)}")
+        if name in ordered:
+            return
+        for dependency in stages[name].depends_on:
+            visit(dependency)
+        ordered.append(name)
+
+    for target in targets:
+        visit(target)
+    return ordered
+
+
+def run_stage(con: duckdb.DuckDBPyConnection, stage: Stage) -> float:
+    """Run the statements of the stage on a new cursor and record its fingerprint, returns the time taken."""
+    start = time.perf_counter()
+    with con.cursor() as cursor:
+        for statement in stage.statements:
+            cursor.execute(statement)
+        duration = time.perf_counter() - start
+        row = [stage.name, stage.fingerprint, duration, table_hash(cursor, stage.name)]
+        cursor.execute("INSERT OR REPLACE INTO _build_stages VALUES (?, ?, current_timestamp, ?, ?)", row)
+    return duration
+
+
+def build(db_path: Path, targets: list[str], force: bool, dry_run: bool, max_workers: int) -> None:
+    stages = parse_stages(QUERY_FILES)
+    con = duckdb.connect(db_path)
+    con.execute(BUILD_TABLES)
+    selected = with_dependencies(stages, targets or list(stages))
+    compute_fingerprints(stages, file_hashes(con, set().union(*(stages[name].files for name in selected))))
+
+    rows = con.sql("SELECT stage, fingerprint, output_hash FROM _build_stages").fetchall()
+    built = {stage: (fingerprint, output) for stage, fingerprint, output in rows}
+    existing = {row[0] for row in con.sql("SELECT table_name FROM duckdb_tables()").fetchall()}
+    forced = set(targets or stages) if force else set()
+    unchanged = {n for n in selected if n not in forced and n in existing and built.get(n, ("",))[0] == stages[n].fingerprint}
+    # An unchanged stage is only skipped if its table was not modified since it was built
+    modified = {name for name in unchanged if table_hash(con, name) != built[name][1]}
+    todo = [name for name in selected if name not in unchanged or name in modified]
+    for name in selected:
+        deps = f" (after {', '.join(stages[name].depends_on)})" if stages[name].depends_on else ""
+        note = " (table modified since its build)" if name in modified else ""
+        print(f"{'build' if name in todo else 'skip ':5} {name}{deps}{note}")
+    if dry_run or not todo:
+        con.close()
+        return
+
+    # Run the stages as soon as the stages they depend on are done.
+    timings: dict[str, float] = {}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running: dict[Future, str] = {}
+        pending = list(todo)
+        while pending or running:
+            for name in [n for n in pending if not set(stages[n].depends_on) & (set(pending) | set(running.values()))]:
+                pending.remove(name)
+                running[executor.submit(run_stage, con, stages[name])] = name
+                print(f"Started {name}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                timings[name] = future.result()
+                print(f"Built {name} in {timings[name]:.2f}s")
+    total = time.perf_counter() - start
+    con.close()
+
+    print(f"\n{'stage':<25} {'seconds':>8}")
+    for name, seconds in sorted(timings.items(), key=lambda t: -t[1]):
+        print(f"{name:<25} {seconds:>8.2f}")
+    print(f"{'total (wall time)':<25} {total:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the database stage by stage, skipping unchanged stages.")
+    parser.add_argument("stages", nargs="*", help="Stages (table names) to build, by default all stages.")
+    parser.add_argument("--db", type=Path, default=DATA_DIR / "data.db", help="Path of the database to build.")
+    parser.add_argument("--force", action="store_true", help="Rebuild the given stages even if they are unchanged.")
+    parser.add_argument("--dry-run", action="store_true", help="Only print which stages would be built.")
+    parser.add_argument("--max-workers", type=int, default=MAX_WORKERS, help="Maximum number of stages run at the same time.")
+    args = parser.parse_args()
+    db_path = args.db.resolve()
+    os.chdir(REPO_DIR)  # The paths in the queries are relative to the repository
+    build(db_path, args.stages, args.force, args.dry_run, args.max_workers)
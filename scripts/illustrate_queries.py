@@ -1,11 +1,25 @@
 #!/usr/bin/env -S uv run
 # type: ignore[reportOptionalMemberAccess]
-"""This script creates a subset of the data and adds illustrations to query files."""
+"""This script creates a subset of the data and adds illustrations to query files.
 
+With --profile it instead runs each CTE (step_N) of a query on the full data with EXPLAIN ANALYZE and writes a report
+of the wall time, peak memory, row count and slowest operators of each step to tmp/profile/<timestamp>/.
+
+Usage:
+    ./scripts/illustrate_queries.py             # add illustrations (run by the pre-commit hook)
+    ./scripts/illustrate_queries.py --profile   # profile the steps of queries/create_table_price.sql
+    ./scripts/illustrate_queries.py --profile queries/create_table_food.sql
+"""
+
+import argparse
+import json
 import re
+import time
+from collections.abc import Iterator
 from contextlib import redirect_stdout
 from io import StringIO
 from pathlib import Path
+from typing import Any
 
 import duckdb
 import sqlglot
@@ -14,6 +28,17 @@ import sqlglot.expressions as exp
 # sqlglot.pretty = True  # Enable pretty printing
 DATA_DIR = Path(__file__).parent.parent / "data"
 QUERIES_DIR = Path(__file__).parent.parent / "queries"
+PROFILE_DIR = Path(__file__).parent.parent / "tmp" / "profile"
+HOT_SPOTS = 5  # Number of slowest operators reported per step
+PROFILING_SETTINGS = {
+    "LATENCY": "true",
+    "CPU_TIME": "true",
+    "SYSTEM_PEAK_BUFFER_MEMORY": "true",
+    "OPERATOR_TYPE": "true",
+    "OPERATOR_TIMING": "true",
+    "OPERATOR_CARDINALITY": "true",
+    "EXTRA_INFO": "true",
+}
 
 
 def get_connection() -> duckdb.DuckDBPyConnection:
@@ -86,44 +111,152 @@ def add_table_illustration(
     query_path.write_text(pattern.sub(table_illustration, query))
 
 
-con = get_connection()
-
-for table in ("ciqual_alim", "ciqual_compo", "calnut_0", "calnut_1", "agribalyse", "euro_exchange_rates", "prices", "products"):
-    add_table_illustration(con, table, QUERIES_DIR / "load.sql", max_width=190)
-
-# Create the illustration tables and add illustrations to create_table_price.sql
-query_path = QUERIES_DIR / "create_table_price.sql"
-expression = sqlglot.parse_one(query_path.read_text())
-# --- Replace the chosen nutrients in the pivot expression ---
-expression.find(exp.Pivot).find(exp.In).args["expressions"] = ["sodium", "protein"]
-# --- Run each CTE as a CREATE TABLE statement ---
-for cte_expression in expression.find(exp.With).expressions:
-    table = exp.Table(this=exp.Identifier(this=cte_expression.alias))
-    create_table = exp.Create(this=table, kind="TABLE", expression=cte_expression.this)
-    con.sql(create_table.sql())
-    add_table_illustration(con, table.name, query_path, max_width=152)
-
-con.close()
-
-con = get_connection()
-
-# Create the illustration tables and add illustrations to the create_table_food
-query_path = QUERIES_DIR / "create_table_food.sql"
-expression = sqlglot.parse_one(query_path.read_text())
-# --- Replace the chosen nutrients in the pivot expression ---
-expression.find(exp.Pivot).find(exp.In).args["expressions"] = ["sodium", "protein"]
-# --- Replace the source tables with the full_tables. ---
-# for table_expression in expression.find_all(exp.Table):
-#     name = table_expression.this.name
-#     if name.startswith("step"):
-#         continue
-#     table_expression.args["this"] = exp.Identifier(this=f"full_tables.{name}")
-# --- Run each CTE as a CREATE TABLE statement ---
-for cte_expression in expression.find(exp.With).expressions:
-    table = exp.Table(this=exp.Identifier(this=cte_expression.alias))
-    create_table = exp.Create(this=table, kind="TABLE", expression=cte_expression.this)
-    con.sql(create_table.sql())
-    add_table_illustration(con, table.name, query_path, max_width=130, max_rows=6)
-
-con.close()
-print("Illustrations created successfully.")
+def cte_tables(expression: exp.Expression) -> Iterator[tuple[str, exp.Create]]:
+    """Yield each CTE of the query as a CREATE TABLE statement, in order (later steps read the earlier tables)."""
+    for cte_expression in expression.find(exp.With).expressions:
+        table = exp.Table(this=exp.Identifier(this=cte_expression.alias))
+        yield table.name, exp.Create(this=table, kind="TABLE", expression=cte_expression.this)
+
+
+def illustrate_queries() -> None:
+    con = get_connection()
+
+    for table in (
+        "ciqual_alim",
+        "ciqual_compo",
+        "calnut_0",
+        "calnut_1",
+        "agribalyse",
+        "euro_exchange_rates",
+        "prices",
+        "products",
+    ):
+        add_table_illustration(con, table, QUERIES_DIR / "load.sql", max_width=190)
+
+    # Create the illustration tables and add illustrations to create_table_price.sql
+    query_path = QUERIES_DIR / "create_table_price.sql"
+    expression = sqlglot.parse_one(query_path.read_text())
+    # --- Replace the chosen nutrients in the pivot expression ---
+    expression.find(exp.Pivot).find(exp.In).args["expressions"] = ["sodium", "protein"]
+    # --- Run each CTE as a CREATE TABLE statement ---
+    for table, create_table in cte_tables(expression):
+        con.sql(create_table.sql())
+        add_table_illustration(con, table, query_path, max_width=152)
+
+    con.close()
+
+    con = get_connection()
+
+    # Create the illustration tables and add illustrations to the create_table_food
+    query_path = QUERIES_DIR / "create_table_food.sql"
+    expression = sqlglot.parse_one(query_path.read_text())
+    # --- Replace the chosen nutrients in the pivot expression ---
+    expression.find(exp.Pivot).find(exp.In).args["expressions"] = ["sodium", "protein"]
+    # --- Run each CTE as a CREATE TABLE statement ---
+    for table, create_table in cte_tables(expression):
+        con.sql(create_table.sql())
+        add_table_illustration(con, table, query_path, max_width=130, max_rows=6)
+
+    con.close()
+    print("Illustrations created successfully.")
+
+
+def get_profiling_connection() -> duckdb.DuckDBPyConnection:
+    """Get a DuckDB connection that reads the full tables and creates the step tables in memory."""
+    con = duckdb.connect(":memory:")
+    con.sql(f"ATTACH DATABASE '{DATA_DIR / 'data.db'}' AS full_tables (READ_ONLY);")
+    con.sql("SET search_path = 'memory.main,full_tables.main';")
+    con.sql(f"SET custom_profiling_settings = '{json.dumps(PROFILING_SETTINGS)}';")
+    con.sql("SET enable_profiling = 'no_output';")  # Otherwise every query prints its profile tree to stdout
+    con.sql("SET enable_progress_bar = false;")
+    return con
+
+
+def iter_operators(node: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    """Yield the operators of a profiled plan (depth first)."""
+    for child in node.get("children", []):
+        yield child
+        yield from iter_operators(child)
+
+
+def profile_step(con: duckdb.DuckDBPyConnection, table: str, create_table: exp.Create) -> dict[str, Any]:
+    """Create the table of the step with EXPLAIN ANALYZE and summarize its profile."""
+    start = time.perf_counter()
+    ((_, plan),) = con.sql(f"EXPLAIN (ANALYZE, FORMAT JSON) {create_table.sql(dialect='duckdb')}").fetchall()
+    wall_time = time.perf_counter() - start
+    plan = json.loads(plan)
+    # The CREATE TABLE and EXPLAIN operators wrap the query, their timings include the operators below them
+    operators = [op for op in iter_operators(plan) if op["operator_type"] not in ("EXPLAIN_ANALYZE", "CREATE_TABLE_AS")]
+    hot_spots = sorted(operators, key=lambda op: -op["operator_timing"])[:HOT_SPOTS]
+    return {
+        "step": table,
+        "wall_time": wall_time,
+        "latency": plan["latency"],
+        "cpu_time": plan["cpu_time"],
+        "peak_memory": plan["system_peak_buffer_memory"],
+        "rows": con.table(table).count("*").fetchone()[0],
+        "hot_spots": [
+            {
+                "operator": op["operator_name"].strip(),
+                "time": op["operator_timing"],
+                "rows": op["operator_cardinality"],
+                "info": ", ".join(f"{k}: {v}" for k, v in op["extra_info"].items() if isinstance(v, str))[:100],
+            }
+            for op in hot_spots
+        ],
+        "plan": plan,
+    }
+
+
+def format_report(query_path: Path, steps: list[dict[str, Any]]) -> str:
+    """Markdown report with a summary of all steps followed by the slowest operators of each step."""
+    total = sum(step["wall_time"] for step in steps)
+    lines = [
+        f"# Profile of {query_path.name}",
+        "",
+        "| step | wall time (s) | share | cpu time (s) | peak memory (MB) | rows |",
+        "| --- | ---: | ---: | ---: | ---: | ---: |",
+    ]
+    lines.extend(
+        f"| {step['step']} | {step['wall_time']:.3f} | {step['wall_time'] / total:.0%} | {step['cpu_time']:.3f} "
+        f"| {step['peak_memory'] / 1e6:.1f} | {step['rows']:,} |"
+        for step in steps
+    )
+    lines.append(f"| total | {total:.3f} | | | | |")
+    for step in steps:
+        lines += ["", f"## {step['step']}", "", "| operator | time (s) | rows | details |", "| --- | ---: | ---: | --- |"]
+        for op in step["hot_spots"]:
+            info = op["info"].replace("|", "\\|").replace("\n", " ")
+            lines.append(f"| {op['operator']} | {op['time']:.3f} | {op['rows']:,} | {info} |")
+    return "\n".join(lines) + "\n"
+
+
+def profile_query(query_path: Path) -> Path:
+    """Profile each step of the query on the full data and write the report, returns the report folder."""
+    con = get_profiling_connection()
+    expression = sqlglot.parse_one(query_path.read_text())
+    steps = []
+    for table, create_table in cte_tables(expression):
+        steps.append(profile_step(con, table, create_table))
+        print(f"Profiled {table} in {steps[-1]['wall_time']:.2f}s")
+    con.close()
+
+    report_dir = PROFILE_DIR / f"{query_path.stem}-{time.strftime('%Y-%m-%d-%H-%M-%S')}"
+    report_dir.mkdir(parents=True)
+    report = format_report(query_path, steps)
+    (report_dir / "report.md").write_text(report)
+    (report_dir / "profile.json").write_text(json.dumps(steps, indent=2))
+    print(report)
+    print(f"Report written to {report_dir}")
+    return report_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add illustrations to the query files or profile the steps of a query.")
+    parser.add_argument("--profile", action="store_true", help="Profile each step of the query on the full data.")
+    parser.add_argument("query", nargs="?", type=Path, default=QUERIES_DIR / "create_table_price.sql", help="Query to profile.")
+    args = parser.parse_args()
+    if args.profile:
+        profile_query(args.query)
+    else:
+        illustrate_queries()
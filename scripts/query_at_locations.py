@@ -4,7 +4,6 @@ from pathlib import Path
 import duckdb
 
 REPO_DIR = Path(__file__).parent.parent
-# QUERY_PATH = REPO_DIR / "queries/price_at_locations_comparison.sql"
 # QUERY_PATH = REPO_DIR / "queries/price_at_locations.sql"
 QUERY_PATH = REPO_DIR / "queries/price_at_locations_other.sql"
 
@@ -1,43 +1,116 @@
 #!/usr/bin/env -S uv run --script
 # /// script
-# dependencies = [ "lxml" ]
+# dependencies = [ "lxml", "pyarrow" ]
 # ///
-"""This script takes an XML file as input and converts it to a CSV file and saves it to the provided path
+"""This script takes pairs of XML input files and output paths, converts each XML file to a CSV or Parquet file
+(depending on the suffix of the output path) and saves it to the provided path.
+The XML files are parsed as a stream, each row is written and then cleared, so memory use stays flat with the size
+of the file. The files are converted in parallel, one process per file.
 NOTE: Currently this script just removes the < characters if they are part of the text due to (recover=True)"""
 
 import csv
 import sys
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 from lxml import etree  # pyright: ignore[reportAttributeAccessIssue]
 
+OUTPUT_SUFFIXES = (".csv", ".parquet")
+PARQUET_BATCH_ROWS = 20_000  # Number of rows kept in memory before writing a Parquet row group
 
-def main(input_file: Path, output_file: Path):
-    parser = etree.XMLParser(encoding="windows-1252", recover=True)
-    with input_file.open("rb") as f:
-        root = etree.parse(f, parser).getroot()
+
+def get_row_tag(input_file: Path) -> str:
+    """The tag of the rows, the first child of the root element (only the start of the file is parsed)."""
+    context = etree.iterparse(str(input_file), events=("start",), encoding="windows-1252", recover=True)
+    next(context)  # The root element
+    _, row = next(context)
+    return row.tag
+
+
+def iter_rows(input_file: Path) -> Iterator[dict[str, str | None]]:
+    """Yield the rows (children of the root element) of the XML file as dicts, clearing each row after it is read."""
+    tag = get_row_tag(input_file)
+    context = etree.iterparse(str(input_file), events=("end",), tag=tag, encoding="windows-1252", recover=True)
+    for _, element in context:
+        yield {c.tag: c.text.strip() if isinstance(c.text, str) else c.text for c in element}
+        # Free the row and the references to the already processed rows kept by the root
+        element.clear(keep_tail=True)
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+
+def write_csv(rows: Iterator[dict[str, str | None]], output_file: Path) -> int:
+    """Write the rows as they are read, the header is taken from the first row."""
+    n = 0
     with output_file.open("w") as f:
-        writer = csv.DictWriter(f, fieldnames=[c.tag for c in root[0]])
-        writer.writeheader()
-        for xml_row in root:
-            writer.writerow({c.tag: c.text.strip() if isinstance(c.text, str) else c.text for c in xml_row})
+        writer = None
+        for row in rows:
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+            n += 1
+    return n
+
+
+def write_parquet(rows: Iterator[dict[str, str | None]], output_file: Path) -> int:
+    """Write the rows in batches as row groups, all columns are strings (as in the XML).
+    The columns are those of the first row, a missing element is a null and the elements not in the first row are
+    reported (they can not be added to the schema of the row groups already written)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    n = 0
+    writer = None
+    columns: dict[str, list[str | None]] = {}
+    unexpected: dict[str, int] = {}
+    for row in rows:
+        if writer is None:
+            writer = pq.ParquetWriter(output_file, pa.schema([(name, pa.string()) for name in row]), compression="zstd")
+            columns = {name: [] for name in row}
+        for name, values in columns.items():
+            values.append(row.get(name))
+        for name in row.keys() - columns.keys():
+            unexpected[name] = unexpected.get(name, 0) + 1
+        n += 1
+        if n % PARQUET_BATCH_ROWS == 0:
+            writer.write_table(pa.table(columns, schema=writer.schema))
+            columns = {name: [] for name in columns}
+    if writer is not None:
+        if n % PARQUET_BATCH_ROWS:
+            writer.write_table(pa.table(columns, schema=writer.schema))
+        writer.close()
+    for name, count in unexpected.items():
+        print(f"Warning: element <{name}> of {count} rows is not a column of {output_file}, it was dropped", file=sys.stderr)
+    return n
+
+
+def main(input_file: Path, output_file: Path) -> int:
+    """Convert one XML file and return the number of rows written."""
+    rows = iter_rows(input_file)
+    if output_file.suffix == ".parquet":
+        return write_parquet(rows, output_file)
+    return write_csv(rows, output_file)
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        exit("Usage: xml_to_csv.py input.xml output.csv")
-
-    input_file = Path(sys.argv[1])
-    if not input_file.exists():
-        exit(f"Input file {input_file} does not exist")
-    if input_file.suffix != ".xml":
-        exit(f"Input file {input_file} is not an XML file")
-
-    output_file = Path(sys.argv[2])
-    if not output_file.parent.exists():
-        exit(f"Output directory {output_file.parent} does not exist")
-    if output_file.suffix != ".csv":
-        exit(f"Output file {output_file} is not a CSV file")
-
-    main(input_file, output_file)
-    print(f"Conversion successful. CSV file saved to {output_file}")
+    args = sys.argv[1:]
+    if not args or len(args) % 2 != 0:
+        exit("Usage: xml_to_csv.py input.xml output.(csv|parquet) [input.xml output.(csv|parquet) ...]")
+
+    pairs = [(Path(i), Path(o)) for i, o in zip(args[::2], args[1::2], strict=True)]
+    for input_file, output_file in pairs:
+        if not input_file.exists():
+            exit(f"Input file {input_file} does not exist")
+        if input_file.suffix != ".xml":
+            exit(f"Input file {input_file} is not an XML file")
+        if not output_file.parent.exists():
+            exit(f"Output directory {output_file.parent} does not exist")
+        if output_file.suffix not in OUTPUT_SUFFIXES:
+            exit(f"Output file {output_file} is not a CSV or Parquet file")
+
+    with ProcessPoolExecutor(max_workers=len(pairs)) as executor:
+        futures = [executor.submit(main, input_file, output_file) for input_file, output_file in pairs]
+        for (_, output_file), future in zip(pairs, futures, strict=True):
+            print(f"Conversion successful. {future.result()} rows saved to {output_file}")